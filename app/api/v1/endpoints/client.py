@@ -1,9 +1,10 @@
 from typing import Optional
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from sqlalchemy import delete, or_, update
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.logger import create_log
+from app.core.plate_cache import plate_cache
 from app.models.activity_log import ActionType, EntityType
 from app.models.client import Client
 from app.models.vehicle import Vehicle
@@ -62,7 +63,9 @@ def create_client(
     )
 
     background_tasks.add_task(
-        manager.broadcast_service_update, action="create", service_data=client.to_dict()
+        manager.broadcast_client_update,
+        action="create",
+        client_data=client.to_dict(rules=("-vehicles",)),
     )
 
     return {"message": "client created", "client": client}
@@ -94,7 +97,9 @@ def update_client(
     )
 
     background_tasks.add_task(
-        manager.broadcast_client_update, action="update", service_data=client.to_dict()
+        manager.broadcast_client_update,
+        action="update",
+        client_data=client.to_dict(rules=("-vehicles",)),
     )
 
     return {"message": "client updated", "client": client}
@@ -104,7 +109,9 @@ def update_client(
 def delete_client(
     client_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
 ):
-    db.execute(delete(Client).where(Client.id == client_id))
+    result = db.execute(delete(Client).where(Client.id == client_id))
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Item not found")
     db.commit()
 
     # Create log
@@ -117,7 +124,7 @@ def delete_client(
     )
 
     background_tasks.add_task(
-        manager.broadcast_client_update, action="delete", service_data={"id": client_id}
+        manager.broadcast_client_update, action="delete", client_data={"id": client_id}
     )
     return {"client_id": client_id, "message": "client deleted"}
 
@@ -135,6 +142,7 @@ def create_client(
     )
     db.execute(update_stmt)
     db.commit()
+    plate_cache.clear()
 
     # Create log
     create_log(
@@ -148,7 +156,9 @@ def create_client(
     client = db.query(Client).filter(Client.id == client_id).first()
 
     background_tasks.add_task(
-        manager.broadcast_client_update, action="update", service_data=client.to_dict()
+        manager.broadcast_client_update,
+        action="update",
+        client_data=client.to_dict(rules=("-vehicles",)),
     )
 
     return {"message": "client created", "client": client}
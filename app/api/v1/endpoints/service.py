@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
-from sqlalchemy import delete, insert, update
+import asyncio
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session, joinedload
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.websocket import manager
 from app.core.logger import create_log
+from app.core.ingestion import broadcast_results, create_services
+from app.core.ingest_queue import ingest_queue
+from app.core.plates import normalize_plate
+from app.core.plate_cache import plate_cache
+from app.core.plate_index import plate_index
+from app.core.dedupe import read_deduplicator
+from app.core.open_services import open_services
 from app.models.service import Service
-from app.models.vehicle import Vehicle
 from app.models.activity_log import ActionType, EntityType
-from app.schemas.service import ServiceCreate, ServiceUpdate
+from app.schemas.service import ServiceBatchCreate, ServiceCreate, ServiceUpdate
 
 router = APIRouter()
 
@@ -18,49 +27,82 @@ def get_services(db: Session = Depends(get_db)):
     return {"services": services}
 
 
+@router.get("/ingest/stats")
+def get_ingest_stats():
+    """Get counters for the plate-read ingestion path"""
+    return {
+        "plate_cache": plate_cache.stats(),
+        "plate_index": plate_index.stats(),
+        "dedupe": read_deduplicator.stats(),
+        "queue": ingest_queue.stats(),
+        "open_services": open_services.stats(),
+    }
+
+
+@router.get("/open")
+def get_open_services(db: Session = Depends(get_db)):
+    """Get the services still open (vehicles currently in the bay)"""
+    services = (
+        db.query(Service).filter(Service.closed_at.is_(None)).order_by(Service.id).all()
+    )
+    return {"services": services}
+
+
 @router.post("/")
 async def create_service(
     body: ServiceCreate,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
-    plate_id = body.plate_id.upper().replace(" ", "").replace("-", "")
-    vehicle = db.query(Vehicle).filter(Vehicle.plate_id == plate_id).first()
-    vehicle_id = None
-    if vehicle:
-        vehicle_id = vehicle.id
-    else:
-        new_vehicle = Vehicle(plate_id=plate_id)
-        db.add(new_vehicle)
-        db.commit()
-        db.refresh(new_vehicle)
-        vehicle_id = new_vehicle.id
-
-    insert_stmt = insert(Service).values(
-        **body.dict(exclude={"plate_id"}), vehicle_id=vehicle_id
-    )
-    result = db.execute(insert_stmt)
-    db.commit()
-    service_id = result.inserted_primary_key[0]
-    service = db.query(Service).filter(Service.id == service_id).first()
-
-    # Create log
-    create_log(
-        db=db,
-        action=ActionType.CREATE,
-        entity=EntityType.SERVICE,
-        entity_id=service.id,
-        message=f"Service created for vehicle {plate_id}",
-    )
+    if settings.INGEST_ASYNC:
+        # Write-behind mode: the ingest queue worker writes and broadcasts
+        if not normalize_plate(body.plate_id):
+            raise HTTPException(status_code=422, detail="empty plate")
+        try:
+            read_id = ingest_queue.enqueue(body)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Ingest queue full",
+            )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "service queued", "id": read_id},
+        )
+
+    # Vehicle get-or-create, service insert ... RETURNING and activity log
+    # all go through one transaction
+    result = create_services(db, [body])[0]
+    if result["status"] == "rejected":
+        raise HTTPException(status_code=422, detail=result["error"])
+    if result["status"] == "suppressed":
+        return {"message": "duplicate read suppressed", "service": None}
+    if result["status"] == "unpaired":
+        return {"message": "no open service to close", "service": None}
 
     # Broadcast WebSocket update
-    background_tasks.add_task(
-        manager.broadcast_service_update,
-        action="create",
-        service_data=service.to_dict(),
-    )
+    background_tasks.add_task(broadcast_results, [result])
+
+    return {"message": f"service {result['status']}", "service": result["service"]}
+
 
-    return {"message": "service created", "service": service}
+@router.post("/batch")
+async def create_services_batch(
+    body: ServiceBatchCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+):
+    """
+    Create services for a burst of plate reads in one transaction.
+    Unknown vehicles are upserted in bulk; results are returned per read.
+    """
+    results = create_services(db, body.reads)
+
+    # Broadcast WebSocket updates
+    background_tasks.add_task(broadcast_results, results)
+
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"message": f"{created} services created", "results": results}
 
 
 @router.get("/{service_id}")
@@ -76,6 +118,10 @@ async def update_service(
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
+    # Sent with the update, so filtered subscribers see the service leave
+    previous = db.query(Service).filter(Service.id == service_id).first()
+    previous_data = previous.to_dict() if previous is not None else None
+
     u = (
         update(Service)
         .where(Service.id == service_id)
@@ -85,6 +131,10 @@ async def update_service(
     db.commit()
     service = db.query(Service).filter(Service.id == service_id).first()
 
+    open_services.close(service_id)
+    if settings.SERVICE_PAIRING and service.closed_at is None:
+        open_services.open(service.vehicle_id, service.id)
+
     # Create log
     create_log(
         db=db,
@@ -99,6 +149,7 @@ async def update_service(
         manager.broadcast_service_update,
         action="update",
         service_data=service.to_dict(),
+        previous=previous_data,
     )
 
     return {"service_id": service_id, "message": "service updated", "service": service}
@@ -116,6 +167,7 @@ async def delete_service(
 
     db.execute(delete(Service).where(Service.id == service_id))
     db.commit()
+    open_services.close(service_id)
 
     # Create log
     create_log(
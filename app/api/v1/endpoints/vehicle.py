@@ -1,10 +1,13 @@
 from typing import Optional, Annotated
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, status, HTTPException
 from sqlalchemy import delete, insert, or_, update
 from sqlalchemy.orm import Session
 from app.api.v1.endpoints.auth import get_current_active_user
 from app.core.database import get_db
 from app.core.logger import create_log
+from app.core.plate_cache import plate_cache
+from app.core.plate_index import plate_index
+from app.core.websocket import manager
 from app.models.activity_log import ActionType, ActivityLog, EntityType
 from app.models.service import Service
 from app.models.vehicle import Vehicle
@@ -48,6 +51,7 @@ def get_vehicle(
 @router.post("/")
 def create_vehicle(
     body: VehicleCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     # user=Depends(get_current_active_user),
 ):
@@ -55,6 +59,7 @@ def create_vehicle(
     db.add(new_vehicle)
     db.commit()
     db.refresh(new_vehicle)
+    plate_index.add(new_vehicle.plate_id, new_vehicle.id)
 
     # Create log
     create_log(
@@ -65,6 +70,13 @@ def create_vehicle(
         message=f"Vehicle {new_vehicle.plate_id} created",
     )
 
+    # Broadcast WebSocket update
+    background_tasks.add_task(
+        manager.broadcast_vehicle_update,
+        action="create",
+        vehicle_data=new_vehicle.to_dict(rules=("-services", "-client")),
+    )
+
     return {"message": "vehicle created", "vehicle": new_vehicle}
 
 
@@ -72,6 +84,7 @@ def create_vehicle(
 def update_vehicle(
     vehicle_id: int,
     body: VehicleCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     # user=Depends(get_current_active_user),
 ):
@@ -82,7 +95,10 @@ def update_vehicle(
     )
     db.execute(update_stmt)
     db.commit()
+    plate_cache.invalidate_vehicle(vehicle_id)
     vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+    if vehicle:
+        plate_index.add(vehicle.plate_id, vehicle.id)
 
     # Create log
     create_log(
@@ -93,18 +109,31 @@ def update_vehicle(
         message=f"Vehicle {vehicle_id} updated",
     )
 
+    # Broadcast WebSocket update
+    if vehicle:
+        background_tasks.add_task(
+            manager.broadcast_vehicle_update,
+            action="update",
+            vehicle_data=vehicle.to_dict(rules=("-services", "-client")),
+        )
+
     return {"message": "vehicle updated", "vehicle": vehicle}
 
 
 @router.delete("/{vehicle_id}")
 def delete_vehicle(
     vehicle_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     # user=Depends(get_current_active_user),
 ):
     delete_stmt = delete(Vehicle).where(Vehicle.id == vehicle_id)
-    db.execute(delete_stmt)
+    result = db.execute(delete_stmt)
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Item not found")
     db.commit()
+    plate_cache.invalidate_vehicle(vehicle_id)
+    plate_index.remove_vehicle(vehicle_id)
 
     # Create log
     create_log(
@@ -115,4 +144,11 @@ def delete_vehicle(
         message=f"Vehicle {vehicle_id} deleted",
     )
 
+    # Broadcast WebSocket update
+    background_tasks.add_task(
+        manager.broadcast_vehicle_update,
+        action="delete",
+        vehicle_data={"id": vehicle_id},
+    )
+
     return {"vehicle_id": vehicle_id, "message": "Vehicle deleted"}
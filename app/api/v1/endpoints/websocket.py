@@ -1,42 +1,190 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.dashboard import dashboard
 from app.core.websocket import manager
-from app.core.database import get_db
+from app.core.ingest_stream import IngestStream
+from app.core.database import SessionLocal
 from app.models.client import Client
 from app.models.service import Service
 from app.models.vehicle import Vehicle
-from app.models.activity_log import ActivityLog
+from app.schemas.service import ServiceFilter, ServiceKind
 from sqlalchemy.orm import joinedload
 import json
 
 router = APIRouter()
 
 
+def load_snapshot(
+    model, cursor: Optional[int] = None, service_filter: Optional[ServiceFilter] = None
+) -> dict:
+    """
+    Load one page of a subscriber's snapshot, newest rows first, in a
+    short-lived session so the pooled connection is returned before the
+    socket starts waiting. Pages are keyed on id, so each page costs the
+    same whatever the table size; `cursor` is the last id already sent.
+    Service snapshots honour the subscriber's filter.
+    """
+    limit = settings.WS_SNAPSHOT_PAGE_SIZE
+    with SessionLocal() as db:
+        query = db.query(model).order_by(model.id.desc())
+        if cursor is not None:
+            query = query.filter(model.id < cursor)
+        if model is Service and service_filter is not None:
+            query = filter_services(query, service_filter)
+        rows = query.limit(limit + 1).all()
+        page = [row.to_dict() for row in rows[:limit]]
+    return {
+        "data": page,
+        "cursor": page[-1]["id"] if page else None,
+        "has_more": len(rows) > limit,
+    }
+
+
+def filter_services(query, service_filter: ServiceFilter):
+    if service_filter.kind is not None:
+        query = query.filter(Service.kind.in_(service_filter.kind))
+    if service_filter.vehicle_id is not None:
+        query = query.filter(Service.vehicle_id.in_(service_filter.vehicle_id))
+    if service_filter.client_id is not None:
+        query = query.join(Service.vehicle).filter(
+            Vehicle.owner_id.in_(service_filter.client_id)
+        )
+    if service_filter.status == "open":
+        query = query.filter(Service.closed_at.is_(None))
+    elif service_filter.status == "closed":
+        query = query.filter(Service.closed_at.is_not(None))
+    return query
+
+
+async def send_snapshot_page(
+    websocket: WebSocket,
+    model,
+    cursor: Optional[int] = None,
+    message_type: str = "snapshot_page",
+    **extra,
+):
+    service_filter = manager.subscriptions.filters.get(websocket)
+    page = await run_in_threadpool(load_snapshot, model, cursor, service_filter)
+    message = {"type": message_type, "action": "list", **page, **extra}
+    await manager.send_message(message, websocket)
+
+
+async def resume_or_snapshot(
+    websocket: WebSocket,
+    topic: str,
+    model,
+    last_seq: Optional[int] = None,
+    epoch: Optional[str] = None,
+):
+    """
+    Replay the events a reconnecting client missed after `last_seq`, or
+    send the first snapshot page when the gap is no longer buffered. Both
+    honour the client's current service filter, so set it first.
+    """
+    if last_seq is not None:
+        replayed = manager.replay(websocket, topic, last_seq, epoch)
+        if replayed is not None:
+            resumed = {
+                "type": "resumed",
+                "epoch": manager.epoch,
+                "seq": manager.sequences.get(topic, 0),
+                "replayed": replayed,
+            }
+            await manager.send_message(resumed, websocket)
+            return
+
+    # Events after this sequence number are delivered on top of the snapshot
+    seq = manager.sequences.get(topic, 0)
+    await send_snapshot_page(
+        websocket, model, message_type="initial_data", epoch=manager.epoch, seq=seq
+    )
+
+
+async def handle_client_message(websocket: WebSocket, model, data: str):
+    """
+    Serve {"type": "more", "cursor": ...} page requests and
+    {"type": "filter", "filter": {...}} service filter changes (an empty
+    filter clears it). Every message, including {"type": "pong"} heartbeat
+    replies, keeps the connection from being reaped; others are ignored.
+    """
+    manager.touch(websocket)
+    try:
+        request = json.loads(data)
+    except ValueError:
+        return
+    if not isinstance(request, dict) or request.get("type") not in ("more", "filter"):
+        return
+
+    if request["type"] == "filter":
+        try:
+            service_filter = ServiceFilter(**(request.get("filter") or {}))
+        except (ValidationError, TypeError) as e:
+            await manager.send_message({"type": "error", "message": str(e)}, websocket)
+            return
+        manager.set_filter(websocket, service_filter)
+        await manager.send_message(
+            {
+                "type": "filter",
+                "filter": service_filter.model_dump(mode="json", exclude_none=True),
+            },
+            websocket,
+        )
+        return
+
+    if model is None:
+        await manager.send_message(
+            {"type": "error", "message": "no snapshot on this topic"}, websocket
+        )
+        return
+
+    cursor = request.get("cursor")
+    if not isinstance(cursor, int):
+        await manager.send_message(
+            {"type": "error", "message": "invalid cursor"}, websocket
+        )
+        return
+    await send_snapshot_page(websocket, model, cursor)
+
+
 @router.websocket("/ws/services")
-async def websocket_services(websocket: WebSocket, db: Session = Depends(get_db)):
+async def websocket_services(
+    websocket: WebSocket,
+    last_seq: Optional[int] = Query(None),
+    epoch: Optional[str] = Query(None),
+    encoding: str = Query("json"),
+    kind: Optional[List[ServiceKind]] = Query(None),
+    vehicle_id: Optional[List[int]] = Query(None),
+    client_id: Optional[List[int]] = Query(None),
+    status: Optional[str] = Query(None),
+):
     """
     WebSocket endpoint for real-time service updates.
     Clients will receive notifications when services are created, updated, or deleted.
+    The kind, vehicle_id, client_id and status (open/closed) query parameters
+    narrow the snapshot and the events; send {"type": "filter", ...} to change them.
     """
-    await manager.connect(websocket, topic="services")
-
     try:
-        # Send initial data
-        services = db.query(Service).all()
-        initial_data = {
-            "type": "initial_data",
-            "action": "list",
-            "data": [service.to_dict() for service in services],
-        }
-        await manager.send_personal_message(json.dumps(initial_data), websocket)
+        await manager.connect(websocket, topic="services", encoding=encoding)
+        manager.set_filter(
+            websocket,
+            ServiceFilter(
+                kind=kind, vehicle_id=vehicle_id, client_id=client_id, status=status
+            ),
+        )
+
+        # Resume from last_seq, or send the first page of initial data
+        # (clients ask for more pages by cursor)
+        await resume_or_snapshot(websocket, "services", Service, last_seq, epoch)
 
         # Keep connection alive and listen for messages
         while True:
             data = await websocket.receive_text()
-            # Echo back or handle client messages if needed
-            await manager.send_personal_message(f"Message received: {data}", websocket)
+            await handle_client_message(websocket, Service, data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket, topic="services")
@@ -46,27 +194,27 @@ async def websocket_services(websocket: WebSocket, db: Session = Depends(get_db)
 
 
 @router.websocket("/ws/vehicles")
-async def websocket_vehicles(websocket: WebSocket, db: Session = Depends(get_db)):
+async def websocket_vehicles(
+    websocket: WebSocket,
+    last_seq: Optional[int] = Query(None),
+    epoch: Optional[str] = Query(None),
+    encoding: str = Query("json"),
+):
     """
     WebSocket endpoint for real-time vehicle updates.
     Clients will receive notifications when vehicles are created, updated, or deleted.
     """
-    await manager.connect(websocket, topic="vehicles")
-
     try:
-        # Send initial data
-        vehicles = db.query(Vehicle).all()
-        initial_data = {
-            "type": "initial_data",
-            "action": "list",
-            "data": [vehicle.to_dict() for vehicle in vehicles],
-        }
-        await manager.send_personal_message(json.dumps(initial_data), websocket)
+        await manager.connect(websocket, topic="vehicles", encoding=encoding)
+
+        # Resume from last_seq, or send the first page of initial data
+        # (clients ask for more pages by cursor)
+        await resume_or_snapshot(websocket, "vehicles", Vehicle, last_seq, epoch)
 
         # Keep connection alive
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(f"Message received: {data}", websocket)
+            await handle_client_message(websocket, Vehicle, data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket, topic="vehicles")
@@ -76,27 +224,27 @@ async def websocket_vehicles(websocket: WebSocket, db: Session = Depends(get_db)
 
 
 @router.websocket("/ws/clients")
-async def websocket_clients(websocket: WebSocket, db: Session = Depends(get_db)):
+async def websocket_clients(
+    websocket: WebSocket,
+    last_seq: Optional[int] = Query(None),
+    epoch: Optional[str] = Query(None),
+    encoding: str = Query("json"),
+):
     """
     WebSocket endpoint for real-time client updates.
     Clients will receive notifications when clients are created, updated, or deleted.
     """
-    await manager.connect(websocket, topic="clients")
-
     try:
-        # Send initial data
-        clients = db.query(Client).all()
-        initial_data = {
-            "type": "initial_data",
-            "action": "list",
-            "data": [client.to_dict() for client in clients],
-        }
-        await manager.send_personal_message(json.dumps(initial_data), websocket)
+        await manager.connect(websocket, topic="clients", encoding=encoding)
+
+        # Resume from last_seq, or send the first page of initial data
+        # (clients ask for more pages by cursor)
+        await resume_or_snapshot(websocket, "clients", Client, last_seq, epoch)
 
         # Keep connection alive
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(f"Message received: {data}", websocket)
+            await handle_client_message(websocket, Client, data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket, topic="clients")
@@ -106,24 +254,38 @@ async def websocket_clients(websocket: WebSocket, db: Session = Depends(get_db))
 
 
 @router.websocket("/ws/all")
-async def websocket_all(websocket: WebSocket):
+async def websocket_all(
+    websocket: WebSocket,
+    last_seq: Optional[int] = Query(None),
+    epoch: Optional[str] = Query(None),
+    encoding: str = Query("json"),
+):
     """
     WebSocket endpoint for all real-time updates.
     Clients will receive notifications for all events (services, vehicles, etc.).
     """
-    await manager.connect(websocket, topic="all")
-
     try:
-        # Send connection confirmation
-        await manager.send_personal_message(
-            json.dumps({"type": "connection", "message": "Connected to all updates"}),
+        await manager.connect(websocket, topic="all", encoding=encoding)
+
+        # Send the events missed since last_seq, then connection confirmation
+        replayed = None
+        if last_seq is not None:
+            replayed = manager.replay(websocket, "all", last_seq, epoch)
+        await manager.send_message(
+            {
+                "type": "connection",
+                "message": "Connected to all updates",
+                "epoch": manager.epoch,
+                "seq": manager.sequences.get("all", 0),
+                "replayed": replayed,
+            },
             websocket,
         )
 
         # Keep connection alive
         while True:
             data = await websocket.receive_text()
-            await manager.send_personal_message(f"Message received: {data}", websocket)
+            await handle_client_message(websocket, None, data)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket, topic="all")
@@ -132,6 +294,67 @@ async def websocket_all(websocket: WebSocket):
         manager.disconnect(websocket, topic="all")
 
 
+@router.websocket("/ws/dashboard")
+async def websocket_dashboard(websocket: WebSocket, encoding: str = Query("json")):
+    """
+    WebSocket endpoint for dashboard statistics.
+    Clients receive the current statistics and recent logs on connect, then
+    {"type": "dashboard_delta"} messages with the counters that changed and
+    a log entry describing the event (null for periodic drift corrections). The statistics
+    are kept in memory, so dashboards do not query the database.
+    """
+    try:
+        await manager.connect(websocket, topic="dashboard", encoding=encoding)
+        await dashboard.ensure_loaded()
+        await dashboard.refresh_logs()
+        await manager.send_message(dashboard.snapshot(), websocket)
+
+        # Keep connection alive
+        while True:
+            data = await websocket.receive_text()
+            await handle_client_message(websocket, None, data)
+
+    except WebSocketDisconnect:
+        manager.disconnect(websocket, topic="dashboard")
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+        manager.disconnect(websocket, topic="dashboard")
+
+
+@router.websocket("/ws/ingest")
+async def websocket_ingest(
+    websocket: WebSocket,
+    camera_id: Optional[str] = Query(None),
+    session: Optional[str] = Query(None),
+):
+    """
+    WebSocket endpoint for camera plate-read ingestion.
+    Cameras push {"seq", "plate_id", "kind"} events over one long-lived
+    connection and receive {"type": "ack", "seq", "status"} for each one.
+    Unacked events should be resent after a reconnect; with a session (a
+    boot id, new whenever the camera restarts its numbering) already
+    committed sequence numbers are acked as "duplicate" without a second
+    write. Without one, seqs are not deduplicated, only repeated plates.
+    """
+    await websocket.accept()
+    stream = IngestStream(websocket, camera_id, session)
+    writer = asyncio.create_task(stream.run_writer())
+
+    try:
+        while True:
+            data = await websocket.receive_text()
+            await stream.receive(data)
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        # Commit what was already accepted; the camera resends anything unacked
+        await stream.queue.join()
+        writer.cancel()
+
+
 @router.get("/ws/stats")
 async def websocket_stats():
     """Get WebSocket connection statistics"""
@@ -140,57 +363,31 @@ async def websocket_stats():
             "services": manager.get_active_connections_count("services"),
             "vehicles": manager.get_active_connections_count("vehicles"),
             "all": manager.get_active_connections_count("all"),
-        }
+            "dashboard": manager.get_active_connections_count("dashboard"),
+        },
+        "connections": manager.get_connection_stats(),
+        "send_queues": manager.get_send_stats(),
+        "broker": manager.broker.stats(),
+        "dashboard": dashboard.stats(),
     }
 
 
 @router.get("/dashboard/stats")
-async def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats():
     """
     Get dashboard statistics including:
     - Recent logs
     - Total clients registered
     - Total vehicles registered
     - Number of services registered today
+    Served from the in-memory dashboard state (see app.core.dashboard),
+    which is loaded on first use and reconciled with the database
+    periodically; the logs are the latest ActivityLog rows.
     """
-    # Get recent logs (últimos 50)
-    recent_logs = (
-        db.query(ActivityLog).order_by(ActivityLog.created_at.desc()).limit(50).all()
-    )
-
-    # Serialize logs
-    logs_data = [
-        {
-            "id": log.id,
-            "action_type": log.action_type.value if log.action_type else None,
-            "entity_type": log.entity_type.value if log.entity_type else None,
-            "entity_id": log.entity_id,
-            "description": log.description,
-            "created_at": log.created_at.isoformat() if log.created_at else None,
-        }
-        for log in recent_logs
-    ]
-
-    # Total clients registered
-    total_clients = db.query(func.count(Client.id)).scalar()
-
-    # Total vehicles registered
-    total_vehicles = db.query(func.count(Vehicle.id)).scalar()
-
-    # Services registered today
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    services_today = (
-        db.query(func.count(Service.id))
-        .filter(Service.created_at >= today_start)
-        .scalar()
-    )
-
+    await dashboard.ensure_loaded()
+    await dashboard.refresh_logs()
     return {
-        "recent_logs": logs_data,
-        "statistics": {
-            "total_clients": total_clients,
-            "total_vehicles": total_vehicles,
-            "services_today": services_today,
-        },
+        "recent_logs": list(dashboard.recent_logs),
+        "statistics": dashboard.statistics(),
         "timestamp": datetime.utcnow().isoformat(),
     }
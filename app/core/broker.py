@@ -0,0 +1,200 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy.engine import make_url
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_MAX_BYTES = 7999
+
+
+class Broker(ABC):
+    """
+    Event bus between the API workers and their WebSocket clients.
+    Events are published once and handed to every subscribed handler on
+    each worker, which fans them out to its own sockets.
+    """
+
+    def __init__(self):
+        self._handlers: List[EventHandler] = []
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, handler: EventHandler):
+        self._handlers.append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, event: dict):
+        pass
+
+    async def dispatch(self, event: dict):
+        """Hand an event to the local handlers"""
+        self.delivered += 1
+        for handler in self._handlers:
+            try:
+                await handler(event)
+            except Exception as e:
+                print(f"Broker handler error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+
+class InProcessBroker(Broker):
+    """Single-worker broker: events go straight to the local handlers"""
+
+    async def publish(self, event: dict):
+        self.published += 1
+        await self.dispatch(event)
+
+
+class PostgresBroker(Broker):
+    """
+    Multi-worker broker over Postgres LISTEN/NOTIFY.
+    Every worker LISTENs on `channel` with a dedicated connection watched by
+    the event loop; publishing is a pg_notify on a second connection, and
+    the publishing worker receives its own event back like everyone else.
+    Events over the NOTIFY payload limit, and events published while the
+    listener is down, are only delivered locally. A broker that was never
+    started (a process without WebSocket clients) only publishes.
+    """
+
+    def __init__(self, dsn: str, channel: str = "anpr_events"):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._listener = None
+        self._notifier = None
+        self._notify_lock = Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+        self.local_only = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        await self._listen()
+
+    async def stop(self):
+        self._running = False
+        self._close_listener()
+        with self._notify_lock:
+            if self._notifier is not None:
+                self._notifier.close()
+                self._notifier = None
+
+    async def publish(self, event: dict):
+        self.published += 1
+        payload = json.dumps(event)
+        if not self._running and len(payload.encode()) <= NOTIFY_MAX_BYTES:
+            # Never started: a publisher-only process such as the frame
+            # pipeline, with no local subscribers
+            try:
+                await run_in_threadpool(self._notify, payload)
+            except Exception as e:
+                print(f"Broker publish error: {e}")
+            return
+        if self._listener is None or len(payload.encode()) > NOTIFY_MAX_BYTES:
+            self.local_only += 1
+            await self.dispatch(event)
+            return
+        try:
+            await run_in_threadpool(self._notify, payload)
+        except Exception as e:
+            print(f"Broker publish error: {e}")
+            self.local_only += 1
+            await self.dispatch(event)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "channel": self.channel,
+            "listening": self._listener is not None,
+            "local_only": self.local_only,
+        }
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        connection = psycopg2.connect(self.dsn)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return connection
+
+    async def _listen(self):
+        try:
+            self._listener = await run_in_threadpool(self._connect)
+            with self._listener.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+        except Exception as e:
+            print(f"Broker listen error: {e}")
+            self._close_listener()
+            self._retry()
+            return
+        self._loop.add_reader(self._listener.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        try:
+            self._listener.poll()
+        except Exception as e:
+            print(f"Broker connection lost: {e}")
+            self._close_listener()
+            self._retry()
+            return
+        while self._listener.notifies:
+            notify = self._listener.notifies.pop(0)
+            asyncio.ensure_future(self.dispatch(json.loads(notify.payload)))
+
+    def _notify(self, payload: str):
+        with self._notify_lock:
+            if self._notifier is None or self._notifier.closed:
+                self._notifier = self._connect()
+            try:
+                with self._notifier.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            except Exception:
+                self._notifier.close()
+                self._notifier = None
+                raise
+
+    def _retry(self, delay: float = 1.0):
+        if not self._running:
+            return
+        self._loop.call_later(delay, lambda: asyncio.ensure_future(self._listen()))
+
+    def _close_listener(self):
+        if self._listener is None:
+            return
+        try:
+            self._loop.remove_reader(self._listener.fileno())
+        except Exception:
+            pass
+        self._listener.close()
+        self._listener = None
+
+
+def create_broker(backend: str = "memory") -> Broker:
+    """Build the broker selected by BROKER_BACKEND"""
+    if backend == "memory":
+        return InProcessBroker()
+    if backend == "postgres":
+        url = make_url(settings.DATABASE_URL).set(drivername="postgresql")
+        return PostgresBroker(
+            url.render_as_string(hide_password=False), settings.BROKER_CHANNEL
+        )
+    raise ValueError(f"Unknown broker backend: {backend}")
@@ -16,10 +16,69 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Ingestion
+    PLATE_CACHE_SIZE: int = 10000
+    PLATE_CACHE_TTL_SECONDS: float = 300
+    # Confusion-weighted edit cost allowed when matching misreads (0 disables)
+    PLATE_MATCH_MAX_COST: float = 0.5
+    DEDUPE_WINDOW_SECONDS: float = 5
+    DEDUPE_MAX_ENTRIES: int = 10000
+    # Queue reads and write them in micro-batches (POST /service/ answers 202)
+    INGEST_ASYNC: bool = False
+    INGEST_QUEUE_SIZE: int = 10000
+    INGEST_FLUSH_SIZE: int = 200
+    INGEST_FLUSH_INTERVAL_MS: float = 50
+    INGEST_WS_QUEUE_SIZE: int = 1000
+    INGEST_WS_BATCH_SIZE: int = 100
+    # Committed seqs remembered above a gap, per camera stream
+    INGEST_WS_DEDUPE_WINDOW: int = 10000
+    # Entry/exit pairing: a repeat read of a plate, or any read from an exit
+    # camera, closes the vehicle's open service instead of opening another
+    SERVICE_PAIRING: bool = False
+    EXIT_CAMERA_IDS: List[str] = []
+
+    # WebSocket fan-out
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # drop_oldest, coalesce, disconnect
+    # Rows per WebSocket snapshot page (initial data and "more" requests)
+    WS_SNAPSHOT_PAGE_SIZE: int = 200
+    # Events kept per topic for clients reconnecting with last_seq
+    WS_REPLAY_BUFFER_SIZE: int = 1000
+    # Batch broadcast events per topic over this window (0 sends each event)
+    WS_COALESCE_MS: float = 0
+    # Heartbeat: ping every interval, drop clients nothing could be sent to
+    # for the timeout (with WS_REQUIRE_PONG, clients that did not answer)
+    WS_PING_INTERVAL_SECONDS: float = 20
+    WS_IDLE_TIMEOUT_SECONDS: float = 60
+    WS_REQUIRE_PONG: bool = False
+    WS_MAX_CONNECTIONS: int = 1000
+    WS_MAX_CONNECTIONS_PER_IP: int = 20
+    # Event bus between workers: "memory" (single worker) or "postgres"
+    BROKER_BACKEND: str = "memory"
+    BROKER_CHANNEL: str = "anpr_events"
+    # Dashboard statistics are kept in memory; recount them from the
+    # database this often to correct drift (0 disables)
+    DASHBOARD_RECONCILE_SECONDS: float = 300
+
+    # Frame pipeline
+    PIPELINE_SOURCE: str = "rtsp://localhost:8554/stream"
+    PIPELINE_RECOGNIZER: str = ""  # "package.module:attribute"
+    PIPELINE_SERVICE_KIND: str = "engine_wash"
+    PIPELINE_MIN_CONFIDENCE: float = 0.5
+    PIPELINE_MOTION_THRESHOLD: int = 25
+    PIPELINE_MOTION_MIN_RATIO: float = 0.01
+    PIPELINE_MOTION_STRIDE: int = 4
+    # Vote one plate per vehicle pass; a pass ends after this gap (0 disables)
+    PIPELINE_VOTE_GAP_SECONDS: float = 1.5
+    PIPELINE_VOTE_MAX_COST: float = 2.0
+    PIPELINE_VOTE_MIN_READS: int = 1
+    # Recognizer processes for the multi-camera scheduler (0 = one per spare core)
+    PIPELINE_WORKERS: int = 0
+
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
 
-    @field_validator("BACKEND_CORS_ORIGINS", mode="before")
+    @field_validator("BACKEND_CORS_ORIGINS", "EXIT_CAMERA_IDS", mode="before")
     @classmethod
     def assemble_cors_origins(cls, v):
         if isinstance(v, str) and not v.startswith("["):
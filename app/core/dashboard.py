@@ -0,0 +1,313 @@
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.websocket import manager
+from app.models.activity_log import ActivityLog
+from app.models.client import Client
+from app.models.service import Service
+from app.models.vehicle import Vehicle
+
+RECENT_LOGS = 50
+
+# Counter changed by a create (+1) or delete (-1) of each entity topic
+COUNTERS = {"clients": "total_clients", "vehicles": "total_vehicles"}
+
+
+def today_start() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def serialize_log(log: ActivityLog) -> dict:
+    return {
+        "id": log.id,
+        "action_type": log.action_type.value if log.action_type else None,
+        "entity_type": log.entity_type.value if log.entity_type else None,
+        "entity_id": log.entity_id,
+        "description": log.description,
+        "created_at": log.created_at.isoformat() if log.created_at else None,
+    }
+
+
+def query_counts(db: Session) -> dict:
+    """Entity counts, straight from the database (full scans)"""
+    services_today = db.query(func.count(Service.id), func.min(Service.id)).filter(
+        Service.created_at >= today_start()
+    )
+    count_today, first_today = services_today.one()
+    return {
+        "statistics": {
+            "total_clients": db.query(func.count(Client.id)).scalar(),
+            "total_vehicles": db.query(func.count(Vehicle.id)).scalar(),
+            "services_today": count_today,
+        },
+        "first_service_today": first_today,
+    }
+
+
+def query_recent_logs(db: Session) -> List[dict]:
+    recent_logs = (
+        db.query(ActivityLog)
+        .order_by(ActivityLog.created_at.desc())
+        .limit(RECENT_LOGS)
+        .all()
+    )
+    return [serialize_log(log) for log in recent_logs]
+
+
+def load_counts() -> dict:
+    with SessionLocal() as db:
+        return query_counts(db)
+
+
+def load_recent_logs() -> List[dict]:
+    with SessionLocal() as db:
+        return query_recent_logs(db)
+
+
+def describe(entity: str, action: str, data: dict) -> str:
+    """Activity-log style description of a broadcast event"""
+    if entity == "service" and action == "create":
+        plate_id = (data.get("vehicle") or {}).get("plate_id")
+        return f"Service created for vehicle {plate_id}"
+    if entity == "service" and action == "update" and data.get("closed_at"):
+        plate_id = (data.get("vehicle") or {}).get("plate_id")
+        return f"Service {data.get('id')} closed for vehicle {plate_id}"
+    if action == "create":
+        label = data.get("plate_id") or data.get("name") or data.get("id")
+        return f"{entity.capitalize()} {label} created"
+    return f"{entity.capitalize()} {data.get('id')} {action}d"
+
+
+class DashboardState:
+    """
+    Dashboard statistics kept in memory, so reading them is O(1). Loaded
+    from the database once, on first use, then maintained from the entity
+    events every worker already receives from the broker: creates and
+    deletes move the counters, and /ws/dashboard subscribers are pushed
+    only what changed ("dashboard_delta"). Every `reconcile_interval`
+    seconds the counters are recounted from the database and any drift
+    (events lost between workers, rows changed outside the API) is
+    corrected.
+    The recent logs are the persisted ActivityLog rows: an event marks
+    them stale and the next read reloads them (one indexed LIMIT query),
+    and the reconcile pass reloads them too, for activity that is logged
+    without an event (e.g. logins).
+    """
+
+    def __init__(
+        self,
+        recent_logs: int = RECENT_LOGS,
+        reconcile_interval: float = settings.DASHBOARD_RECONCILE_SECONDS,
+    ):
+        self.recent_logs: Deque[dict] = deque(maxlen=recent_logs)
+        self.reconcile_interval = reconcile_interval
+        self._reconciler: Optional[asyncio.Task] = None
+        self.clear()
+
+    def load(self, db: Session):
+        counts = query_counts(db)
+        for field, value in counts["statistics"].items():
+            setattr(self, field, value)
+        self.first_service_today = counts["first_service_today"]
+        self.day = today_start()
+        self.recent_logs.clear()
+        self.recent_logs.extend(query_recent_logs(db))
+        self._logs_stale = False
+        self.loaded = True
+
+    async def ensure_loaded(self):
+        """Load on first use (in the threadpool) and start reconciling"""
+        if not self.loaded:
+            # The first HTTP request and the first socket may race here
+            async with self._load_lock:
+                if not self.loaded:
+                    await run_in_threadpool(self._load_in_session)
+        self.start_reconciler()
+
+    def _load_in_session(self):
+        with SessionLocal() as db:
+            self.load(db)
+
+    def clear(self):
+        self.loaded = False
+        self.total_clients = 0
+        self.total_vehicles = 0
+        self.services_today = 0
+        # Service ids grow, so a deleted service counts for today when its
+        # id is at least the first one created today
+        self.first_service_today: Optional[int] = None
+        self.day = today_start()
+        self.recent_logs.clear()
+        self._logs_stale = False
+        self._load_lock = asyncio.Lock()
+        self.deltas = 0
+        self.reconciled = 0
+        self.corrections = 0
+
+    async def refresh_logs(self, force: bool = False):
+        """Reload the recent logs if an event made them stale"""
+        if not (self._logs_stale or force):
+            return
+        # Events applied during the query mark them stale again
+        self._logs_stale = False
+        try:
+            logs = await run_in_threadpool(load_recent_logs)
+        except Exception:
+            self._logs_stale = True
+            raise
+        self.recent_logs.clear()
+        self.recent_logs.extend(logs)
+
+    def statistics(self) -> dict:
+        self._roll_day()
+        return {
+            "total_clients": self.total_clients,
+            "total_vehicles": self.total_vehicles,
+            "services_today": self.services_today,
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "dashboard",
+            "statistics": self.statistics(),
+            "recent_logs": list(self.recent_logs),
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+
+    def apply(self, topic: str, message: dict) -> Optional[dict]:
+        """Fold one entity event into the state; returns the delta to push"""
+        action = message.get("action")
+        data = message.get("data")
+        if action not in ("create", "update", "delete") or not isinstance(data, dict):
+            return None
+        self._roll_day()
+        entity = topic[:-1]
+        before = self.statistics()
+
+        step = {"create": 1, "delete": -1}.get(action, 0)
+        if topic in COUNTERS:
+            field = COUNTERS[topic]
+            setattr(self, field, max(getattr(self, field) + step, 0))
+        elif topic == "services":
+            service_id = data.get("id")
+            if action == "create":
+                self.services_today += 1
+                if self.first_service_today is None:
+                    self.first_service_today = service_id
+            elif (
+                action == "delete"
+                and self.first_service_today is not None
+                and service_id is not None
+                and service_id >= self.first_service_today
+            ):
+                self.services_today = max(self.services_today - 1, 0)
+            if message.get("vehicle_created"):
+                self.total_vehicles += 1
+
+        entry = {
+            "id": None,
+            "action_type": action,
+            "entity_type": entity,
+            "entity_id": data.get("id"),
+            "description": describe(entity, action, data),
+            "created_at": message.get("timestamp"),
+        }
+        # The event's own log row is read back on the next refresh_logs()
+        self._logs_stale = True
+        after = self.statistics()
+        changed = {k: v for k, v in after.items() if before[k] != v}
+        return {"type": "dashboard_delta", "statistics": changed, "log": entry}
+
+    async def on_event(self, event: dict):
+        """Broker handler: apply entity events and push the deltas"""
+        topics = event.get("topics") or []
+        if not self.loaded or not topics or topics[0] not in (*COUNTERS, "services"):
+            return
+        delta = self.apply(topics[0], event["message"])
+        if delta is not None:
+            self.deltas += 1
+            # Every worker applies the event itself, so push locally
+            await manager.broadcast(delta, ("dashboard",))
+
+    def reconcile(self, counts: dict, baseline: Optional[dict] = None) -> dict:
+        """
+        Correct the counters to a recount; returns the fields that drifted.
+        `baseline` is the statistics() snapshot taken when the recount
+        started: only the difference between the recount and that snapshot
+        is applied, so events applied while the recount ran are kept.
+        """
+        current = self.statistics()
+        baseline = baseline or current
+        drifted = {}
+        for field, value in counts["statistics"].items():
+            drift = value - baseline[field]
+            if drift:
+                drifted[field] = max(current[field] + drift, 0)
+                setattr(self, field, drifted[field])
+        if counts["first_service_today"] is not None:
+            self.first_service_today = counts["first_service_today"]
+        self.reconciled += 1
+        self.corrections += len(drifted)
+        return drifted
+
+    def start_reconciler(self):
+        """Start the reconcile task on the running loop (no-op if running)"""
+        if self.reconcile_interval <= 0:
+            return
+        if self._reconciler is not None and not self._reconciler.done():
+            return
+        self._reconciler = asyncio.ensure_future(self._run_reconciler())
+
+    def stop(self):
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            self._reconciler = None
+
+    async def _run_reconciler(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            baseline = self.statistics()
+            day = self.day
+            try:
+                counts = await run_in_threadpool(load_counts)
+                # Also picks up activity logged without an event
+                await self.refresh_logs(force=True)
+            except Exception as e:
+                print(f"Dashboard reconcile error: {e}")
+                continue
+            self._roll_day()
+            if self.day != day:
+                # The day rolled over during the recount; services_today of
+                # the recount and the baseline belong to different days
+                counts["statistics"].pop("services_today")
+            drifted = self.reconcile(counts, baseline)
+            if drifted:
+                print(f"Dashboard counters drifted: {drifted}")
+                delta = {"type": "dashboard_delta", "statistics": drifted, "log": None}
+                await manager.broadcast(delta, ("dashboard",))
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "deltas": self.deltas,
+            "reconciled": self.reconciled,
+            "corrections": self.corrections,
+        }
+
+    def _roll_day(self):
+        day = today_start()
+        if day != self.day:
+            self.day = day
+            self.services_today = 0
+            self.first_service_today = None
+
+
+# Global instance
+dashboard = DashboardState()
+manager.broker.subscribe(dashboard.on_event)
@@ -2,7 +2,7 @@ from sqlalchemy_serializer import SerializerMixin
 
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
 
 engine = create_engine(settings.DATABASE_URL)
@@ -20,6 +20,15 @@ def get_db():
         db.close()
 
 
+def dialect_insert(db: Session, model):
+    """Return an INSERT construct for the session's dialect (supports ON CONFLICT)"""
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model)
+
+
 def init_db():
     """Initialize database tables"""
     # Import all models here to ensure they are registered with Base
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Iterable, Tuple
+import time
+from app.core.config import settings
+
+
+class ReadDeduplicator:
+    """
+    Suppresses repeated reads of the same plate from the same camera.
+    A read is a duplicate if the same (camera id, plate) was seen less than
+    `window` seconds ago; every read slides the window, so a car idling in
+    front of the camera yields a single service. Memory is bounded by
+    `max_entries`, oldest keys are evicted first.
+    """
+
+    def __init__(self, window: float = 5, max_entries: int = 10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._last_seen: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = Lock()
+        self.accepted = 0
+        self.suppressed = 0
+
+    def is_duplicate(self, camera_id: str, plate_id: str) -> bool:
+        """Record a read and tell whether it should be dropped"""
+        if self.window <= 0:
+            return False
+        key = (camera_id, plate_id)
+        now = time.monotonic()
+        with self._lock:
+            last_seen = self._last_seen.pop(key, None)
+            self._last_seen[key] = now
+            if len(self._last_seen) > self.max_entries:
+                self._last_seen.popitem(last=False)
+            if last_seen is not None and now - last_seen < self.window:
+                self.suppressed += 1
+                return True
+            self.accepted += 1
+            return False
+
+    def forget(self, keys: Iterable[Tuple[str, str]]):
+        """Drop keys whose reads were not persisted, so a retry goes through"""
+        with self._lock:
+            for key in keys:
+                self._last_seen.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._last_seen.clear()
+
+    def stats(self) -> dict:
+        """Get accepted/suppressed counters"""
+        return {
+            "window_seconds": self.window,
+            "size": len(self._last_seen),
+            "max_entries": self.max_entries,
+            "accepted": self.accepted,
+            "suppressed": self.suppressed,
+        }
+
+
+# Global instance
+read_deduplicator = ReadDeduplicator(
+    window=settings.DEDUPE_WINDOW_SECONDS, max_entries=settings.DEDUPE_MAX_ENTRIES
+)
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from typing import List, Optional
+from uuid import uuid4
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.ingestion import broadcast_results, create_services_in_session
+from app.schemas.service import ServiceCreate
+
+
+class IngestQueue:
+    """
+    Write-behind queue for plate reads.
+    Endpoints enqueue validated reads and return immediately; a background
+    worker drains the queue in micro-batches, flushing when `batch_size`
+    reads are waiting or `flush_interval` seconds after the first one, and
+    writes each batch with one transaction through create_services.
+    Reads still queued when the process dies are lost.
+    """
+
+    def __init__(self, maxsize: int = 10000, batch_size: int = 200, flush_interval: float = 0.05):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.failed = 0
+        self.last_flush_size = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._total_flush_seconds = 0.0
+
+    def start(self):
+        """Start the worker on the running event loop (no-op if running)"""
+        if self._worker is not None and not self._worker.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued, then stop the worker"""
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        self._worker = None
+        self._queue = None
+
+    def enqueue(self, read: ServiceCreate) -> str:
+        """Queue a read and return its id; raises asyncio.QueueFull"""
+        self.start()
+        read_id = uuid4().hex
+        try:
+            self._queue.put_nowait((read_id, read))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        self.enqueued += 1
+        return read_id
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.flush([read for _, read in batch])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def flush(self, reads: List[ServiceCreate]):
+        started = time.perf_counter()
+        try:
+            results = await run_in_threadpool(create_services_in_session, reads)
+        except Exception as e:
+            print(f"Ingest flush error: {e}")
+            self.failed += len(reads)
+            return
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed += len(reads)
+        self.last_flush_size = len(reads)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self._total_flush_seconds += elapsed
+
+        await broadcast_results(results)
+
+    def stats(self) -> dict:
+        """Get queue depth and flush metrics"""
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "last_flush_size": self.last_flush_size,
+            "avg_flush_size": self.flushed / self.flushes if self.flushes else 0,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "avg_flush_ms": (
+                round(self._total_flush_seconds / self.flushes * 1000, 3) if self.flushes else 0
+            ),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+        }
+
+
+# Global instance
+ingest_queue = IngestQueue(
+    maxsize=settings.INGEST_QUEUE_SIZE,
+    batch_size=settings.INGEST_FLUSH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL_MS / 1000,
+)
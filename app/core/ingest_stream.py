@@ -0,0 +1,167 @@
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Hashable, List, Optional
+from fastapi import WebSocket
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.ingestion import (
+    BROADCAST_ACTIONS,
+    broadcast_results,
+    create_services_in_session,
+)
+from app.schemas.service import ServiceCreate
+
+
+class CommittedSeqs:
+    """
+    Sequence numbers committed per camera stream, so reads a camera resends
+    after a reconnect are acked again without being written twice.
+    A stream is a camera id plus the session the camera announces (a boot
+    id), so a camera that restarts its numbering under a new session is not
+    suppressed. Without a session a restart cannot be told from a resend,
+    so such connections are not deduplicated by seq at all. Per stream a mark covers the contiguously committed seqs and
+    a set holds the ones committed above a gap (a failed batch), so a resent
+    read from the gap is still written. The set is bounded by `window`: past
+    it the oldest gap is given up on and the mark moves over it.
+    """
+
+    def __init__(self, window: int = 10000, max_streams: int = 1000):
+        self.window = window
+        self.max_streams = max_streams
+        self._streams: OrderedDict = OrderedDict()
+
+    def is_committed(self, stream: Hashable, seq: int) -> bool:
+        state = self._streams.get(stream)
+        if state is None:
+            return False
+        mark, above = state
+        return seq <= mark or seq in above
+
+    def commit(self, stream: Hashable, seq: int):
+        state = self._streams.get(stream)
+        if state is None:
+            state = self._streams[stream] = [-1, set()]
+            if len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        self._streams.move_to_end(stream)
+        if seq <= state[0]:
+            return
+        above = state[1]
+        above.add(seq)
+        if len(above) > self.window:
+            state[0] = min(above)
+            above.discard(state[0])
+        while state[0] + 1 in above:
+            state[0] += 1
+            above.discard(state[0])
+
+    def clear(self):
+        self._streams.clear()
+
+
+committed_seq = CommittedSeqs(settings.INGEST_WS_DEDUPE_WINDOW)
+
+
+class IngestStream:
+    """
+    One camera connection on /ws/ingest.
+    The receive loop validates plate events and puts them on a bounded
+    queue; a writer task drains it in micro-batches through the shared
+    ingestion path and acks every event by sequence number. When the queue
+    is full the receive loop stops reading, so a slow database pushes back
+    on the camera through TCP flow control instead of buffering without
+    bound.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        camera_id: Optional[str] = None,
+        session: Optional[str] = None,
+    ):
+        self.websocket = websocket
+        self.camera_id = camera_id
+        self.session = session
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_WS_QUEUE_SIZE)
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(message))
+
+    async def receive(self, data: str):
+        """Validate one event and queue it for the writer"""
+        seq = None
+        try:
+            event = json.loads(data)
+            seq = event.get("seq")
+            if seq is not None and (not isinstance(seq, int) or isinstance(seq, bool)):
+                raise ValueError("seq must be an integer")
+            if self.camera_id is not None:
+                event.setdefault("camera_id", self.camera_id)
+            read = ServiceCreate(**event)
+        except (ValueError, TypeError, AttributeError) as e:
+            await self.send(
+                {"type": "ack", "seq": seq, "status": "error", "error": str(e)}
+            )
+            return
+
+        stream = self._stream(read)
+        if (
+            seq is not None
+            and stream is not None
+            and committed_seq.is_committed(stream, seq)
+        ):
+            await self.send({"type": "ack", "seq": seq, "status": "duplicate"})
+            return
+
+        if self.queue.full():
+            await self.send({"type": "backpressure", "pending": self.queue.qsize()})
+        await self.queue.put((seq, read))
+
+    async def run_writer(self):
+        """Drain the queue in micro-batches until cancelled"""
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < settings.INGEST_WS_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def write(self, batch: List[tuple]):
+        reads = [read for _, read in batch]
+        try:
+            results = await run_in_threadpool(create_services_in_session, reads)
+        except Exception as e:
+            print(f"Ingest write error: {e}")
+            for seq, _ in batch:
+                await self._ack(seq, {"status": "error", "error": "write failed"})
+            return
+
+        for (seq, read), result in zip(batch, results):
+            stream = self._stream(read)
+            if seq is not None and stream is not None:
+                committed_seq.commit(stream, seq)
+            ack = {"status": result["status"]}
+            if result["status"] in BROADCAST_ACTIONS:
+                ack["service_id"] = result["service"]["id"]
+            elif result["status"] == "rejected":
+                ack["error"] = result["error"]
+            await self._ack(seq, ack)
+        await broadcast_results(results)
+
+    def _stream(self, read: ServiceCreate) -> Optional[tuple]:
+        if read.camera_id is None or self.session is None:
+            return None
+        return (read.camera_id, self.session)
+
+    async def _ack(self, seq, ack: dict):
+        try:
+            await self.send({"type": "ack", "seq": seq, **ack})
+        except Exception:
+            # Camera is gone; it will resend and get a "duplicate" ack
+            pass
@@ -0,0 +1,292 @@
+import asyncio
+from typing import Dict, Iterable, List, Set, Tuple
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal, dialect_insert
+from app.core.dedupe import read_deduplicator
+from app.core.open_services import open_services
+from app.core.plate_cache import plate_cache
+from app.core.plate_index import plate_index
+from app.core.plates import normalize_plate
+from app.core.websocket import manager
+from app.models.activity_log import ActivityLog, ActionType, EntityType
+from app.models.service import Service
+from app.models.vehicle import Vehicle
+from app.schemas.service import ServiceCreate
+
+# WebSocket action to broadcast for each ingestion result status
+BROADCAST_ACTIONS = {"created": "create", "closed": "update"}
+
+
+def resolve_vehicles(
+    db: Session, plates: Iterable[str]
+) -> Tuple[Dict[str, dict], List[str], Set[str]]:
+    """
+    Map normalized plates to serialized vehicles, creating the unknown ones
+    in bulk. Plates seen recently are answered from the plate cache; missing
+    vehicles are inserted with INSERT ... ON CONFLICT DO NOTHING on
+    vehicles.plate_id, so concurrent writers never fail on the unique index.
+    Nothing is committed here; the second value lists the plates that were
+    loaded from the database and should be cached once the caller commits,
+    the third the plates whose vehicle was created by this call.
+    """
+    vehicles = {}
+    for plate_id in set(plates):
+        vehicles[plate_id] = plate_cache.get(plate_id)
+
+    missing = {plate_id for plate_id, vehicle in vehicles.items() if vehicle is None}
+    if not missing:
+        return vehicles, [], set()
+
+    found = list(db.scalars(select(Vehicle).where(Vehicle.plate_id.in_(missing))))
+
+    unknown = missing - {vehicle.plate_id for vehicle in found}
+    created = set()
+    if unknown:
+        upsert_stmt = (
+            dialect_insert(db, Vehicle)
+            .on_conflict_do_nothing(index_elements=["plate_id"])
+            .returning(Vehicle)
+        )
+        inserted = list(db.scalars(upsert_stmt, [{"plate_id": p} for p in unknown]))
+        created = {vehicle.plate_id for vehicle in inserted}
+        found += inserted
+
+        # Rows inserted by a concurrent writer are not returned on conflict
+        lost = unknown - {vehicle.plate_id for vehicle in found}
+        if lost:
+            found += db.scalars(select(Vehicle).where(Vehicle.plate_id.in_(lost)))
+
+    for vehicle in found:
+        # Columns only; serializing services would lazy-load the history
+        vehicles[vehicle.plate_id] = vehicle.to_dict(rules=("-services", "-client"))
+    return vehicles, list(missing), created
+
+
+def create_services(db: Session, reads: List[ServiceCreate]) -> List[dict]:
+    """
+    Create one service per plate read in a single transaction.
+    Returns one result per read, in input order. Misreads of known plates are
+    resolved through the plate index, and repeated reads from the same
+    camera are suppressed before touching the database. Created services
+    carry the serialized row (built before commit, so no re-SELECT is needed).
+    With SERVICE_PAIRING on, a read of a vehicle with an open service closes
+    it instead ("closed"); see _pair_reads.
+    """
+    results = []
+    accepted = []
+    dedupe_keys = []
+    for index, read in enumerate(reads):
+        plate_id = normalize_plate(read.plate_id)
+        result = {"index": index, "plate_id": plate_id}
+        match = plate_index.match(plate_id) if plate_id else None
+        if match is not None and match.cost > 0:
+            # OCR misread of a known plate
+            plate_id = match.plate_id
+            result.update(
+                plate_id=plate_id,
+                read_plate_id=result["plate_id"],
+                match_confidence=match.confidence,
+            )
+
+        if not plate_id:
+            result.update(status="rejected", error="empty plate")
+        elif read.camera_id is not None and read_deduplicator.is_duplicate(
+            read.camera_id, plate_id
+        ):
+            result.update(status="suppressed")
+        else:
+            if read.camera_id is not None:
+                dedupe_keys.append((read.camera_id, plate_id))
+            accepted.append(result)
+        results.append(result)
+
+    if not accepted:
+        return results
+
+    try:
+        _insert_services(db, reads, accepted)
+    except Exception:
+        read_deduplicator.forget(dedupe_keys)
+        raise
+    return results
+
+
+async def broadcast_results(results: List[dict]):
+    """Broadcast the services written by create_services"""
+    for result in results:
+        if result["status"] in BROADCAST_ACTIONS:
+            service = result["service"]
+            await manager.broadcast_service_update(
+                action=BROADCAST_ACTIONS[result["status"]],
+                service_data=service,
+                vehicle_created=result.get("vehicle_created", False),
+                # A paired read closed a service that was open until now
+                previous=(
+                    {**service, "closed_at": None}
+                    if result["status"] == "closed"
+                    else None
+                ),
+            )
+
+
+def broadcast_results_sync(results: List[dict]):
+    """broadcast_results for threads without an event loop (frame pipeline)"""
+    asyncio.run(broadcast_results(results))
+
+
+def create_services_in_session(reads: List[ServiceCreate]) -> List[dict]:
+    """Run create_services in a short-lived session, for background writers"""
+    with SessionLocal() as db:
+        return create_services(db, reads)
+
+
+def _pair_reads(
+    db: Session,
+    reads: List[ServiceCreate],
+    accepted: List[dict],
+    vehicles: Dict[str, dict],
+) -> Tuple[List[dict], List[tuple]]:
+    """
+    Split accepted reads into services to create and services to close.
+    With pairing on, a read of a vehicle that has an open service closes it
+    (the target is a service id, or the result of a read earlier in the
+    batch that creates it); an exit-camera read with nothing to close is
+    marked "unpaired".
+    """
+    if not settings.SERVICE_PAIRING:
+        return accepted, []
+
+    open_ids = open_services.lookup(
+        db, (vehicles[r["plate_id"]]["id"] for r in accepted)
+    )
+    creates, closes = [], []
+    batch_open = {}
+    for r in accepted:
+        vehicle_id = vehicles[r["plate_id"]]["id"]
+        if vehicle_id in batch_open:
+            target = batch_open[vehicle_id]
+        else:
+            target = open_ids.get(vehicle_id)
+
+        if target is not None:
+            closes.append((r, target))
+            batch_open[vehicle_id] = None
+        elif reads[r["index"]].camera_id in settings.EXIT_CAMERA_IDS:
+            r.update(status="unpaired")
+        else:
+            creates.append(r)
+            batch_open[vehicle_id] = r
+    return creates, closes
+
+
+def _close_services(db: Session, service_ids: List[int]) -> Dict[int, Service]:
+    """Close open services by id; services already closed are skipped"""
+    if not service_ids:
+        return {}
+    closed = db.scalars(
+        update(Service)
+        .where(Service.id.in_(service_ids), Service.closed_at.is_(None))
+        .values(closed_at=func.now())
+        .returning(Service)
+    )
+    return {service.id: service for service in closed}
+
+
+def _insert_services(db: Session, reads: List[ServiceCreate], accepted: List[dict]):
+    vehicles, loaded, new_vehicles = resolve_vehicles(
+        db, (r["plate_id"] for r in accepted)
+    )
+    creates, closes = _pair_reads(db, reads, accepted, vehicles)
+
+    # Services closed by another writer leave a stale map entry; those reads
+    # open a new service instead
+    closed = _close_services(
+        db, [target for _, target in closes if isinstance(target, int)]
+    )
+    stale = [(r, t) for r, t in closes if isinstance(t, int) and t not in closed]
+    for r, target in stale:
+        open_services.close(target)
+        creates.append(r)
+    closes = [close for close in closes if close not in stale]
+
+    services = []
+    if creates:
+        services = db.scalars(
+            insert(Service).returning(Service, sort_by_parameter_order=True),
+            [
+                {
+                    "vehicle_id": vehicles[r["plate_id"]]["id"],
+                    "kind": reads[r["index"]].kind,
+                }
+                for r in creates
+            ],
+        ).all()
+    created = {id(r): service for r, service in zip(creates, services)}
+
+    # Reads closing a service opened earlier in the same batch
+    closed.update(
+        _close_services(
+            db,
+            [
+                created[id(target)].id
+                for _, target in closes
+                if isinstance(target, dict)
+            ],
+        )
+    )
+    closes = [
+        (r, target if isinstance(target, int) else created[id(target)].id)
+        for r, target in closes
+    ]
+
+    logs = [
+        {
+            "action_type": ActionType.CREATE,
+            "entity_type": EntityType.SERVICE,
+            "entity_id": service.id,
+            "description": f"Service created for vehicle {r['plate_id']}",
+        }
+        for r, service in zip(creates, services)
+    ]
+    logs += [
+        {
+            "action_type": ActionType.UPDATE,
+            "entity_type": EntityType.SERVICE,
+            "entity_id": service_id,
+            "description": f"Service {service_id} closed for vehicle {r['plate_id']}",
+        }
+        for r, service_id in closes
+    ]
+    if logs:
+        db.execute(insert(ActivityLog), logs)
+
+    for r, service in zip(creates, services):
+        service_data = service.to_dict(rules=("-vehicle",))
+        r.update(
+            status="created",
+            service={**service_data, "vehicle": vehicles[r["plate_id"]]},
+        )
+    for r, service_id in closes:
+        service_data = closed[service_id].to_dict(rules=("-vehicle",))
+        r.update(
+            status="closed",
+            service={**service_data, "vehicle": vehicles[r["plate_id"]]},
+        )
+    for r in accepted:
+        if r["plate_id"] in new_vehicles and "service" in r:
+            # Reported once, with the first read of the plate
+            r["vehicle_created"] = True
+            new_vehicles.discard(r["plate_id"])
+
+    db.commit()
+
+    for plate_id in loaded:
+        plate_cache.put(plate_id, vehicles[plate_id])
+        plate_index.add(plate_id, vehicles[plate_id]["id"])
+    if settings.SERVICE_PAIRING:
+        for service in services:
+            open_services.open(service.vehicle_id, service.id)
+        for _, service_id in closes:
+            open_services.close(service_id)
@@ -0,0 +1,85 @@
+from threading import Lock
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.models.service import Service
+
+
+class OpenServiceMap:
+    """
+    In-memory map from vehicle id to its latest open service (closed_at IS
+    NULL), so the pairing engine finds the service a read should close with
+    a dict lookup. Loaded at startup through the partial index on open
+    services and kept current by the ingestion path and the service
+    endpoints; vehicles missing from it are looked up on the index, since
+    other workers open services too.
+    """
+
+    def __init__(self):
+        self._by_vehicle: Dict[int, int] = {}
+        self._by_service: Dict[int, int] = {}
+        self._lock = Lock()
+
+    def get(self, vehicle_id: int) -> Optional[int]:
+        return self._by_vehicle.get(vehicle_id)
+
+    def lookup(self, db: Session, vehicle_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Latest open service of each vehicle that has one. The map is only a
+        cache (other workers open services too): misses are looked up in
+        one query on the partial index and filled in.
+        """
+        vehicle_ids = set(vehicle_ids)
+        found = {v: self._by_vehicle[v] for v in vehicle_ids if v in self._by_vehicle}
+        missing = vehicle_ids - found.keys()
+        if missing:
+            rows = db.execute(
+                select(Service.vehicle_id, func.max(Service.id))
+                .where(Service.closed_at.is_(None), Service.vehicle_id.in_(missing))
+                .group_by(Service.vehicle_id)
+            )
+            for vehicle_id, service_id in rows:
+                self.open(vehicle_id, service_id)
+                found[vehicle_id] = service_id
+        return found
+
+    def open(self, vehicle_id: int, service_id: int):
+        """Record an open service, unless the vehicle has a newer one"""
+        with self._lock:
+            current = self._by_vehicle.get(vehicle_id)
+            if current is not None:
+                if current > service_id:
+                    return
+                self._by_service.pop(current, None)
+            self._by_vehicle[vehicle_id] = service_id
+            self._by_service[service_id] = vehicle_id
+
+    def close(self, service_id: int):
+        """Forget a service that was closed, deleted or moved"""
+        with self._lock:
+            vehicle_id = self._by_service.pop(service_id, None)
+            if vehicle_id is not None:
+                self._by_vehicle.pop(vehicle_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._by_vehicle.clear()
+            self._by_service.clear()
+
+    def load(self, db: Session):
+        """Load the latest open service of every vehicle"""
+        rows = db.execute(
+            select(Service.vehicle_id, func.max(Service.id))
+            .where(Service.closed_at.is_(None), Service.vehicle_id.is_not(None))
+            .group_by(Service.vehicle_id)
+        )
+        self.clear()
+        for vehicle_id, service_id in rows:
+            self.open(vehicle_id, service_id)
+
+    def stats(self) -> dict:
+        return {"open": len(self._by_vehicle)}
+
+
+# Global instance
+open_services = OpenServiceMap()
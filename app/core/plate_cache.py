@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Set
+import time
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.vehicle import Vehicle
+
+
+class PlateCache:
+    """
+    Bounded LRU/TTL cache from normalized plate to serialized vehicle.
+    Lets the ingestion path skip the vehicle lookup for plates it has seen
+    recently. Entries expire after `ttl` seconds so changes made by other
+    workers are picked up eventually.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # vehicle id -> plates cached for it, used for invalidation
+        self._plates_by_vehicle: Dict[int, Set[str]] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, plate_id: str) -> Optional[dict]:
+        """Return the cached vehicle for a plate, or None"""
+        with self._lock:
+            entry = self._entries.get(plate_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            vehicle_data, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(plate_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(plate_id)
+            self.hits += 1
+            return vehicle_data
+
+    def put(self, plate_id: str, vehicle_data: dict):
+        """Cache a serialized vehicle under a normalized plate"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if plate_id in self._entries:
+                self._remove(plate_id)
+            self._entries[plate_id] = (vehicle_data, time.monotonic() + self.ttl)
+            self._plates_by_vehicle.setdefault(vehicle_data["id"], set()).add(plate_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, plate_id: str):
+        """Drop a single plate"""
+        with self._lock:
+            if plate_id in self._entries:
+                self._remove(plate_id)
+
+    def invalidate_vehicle(self, vehicle_id: int):
+        """Drop every plate cached for a vehicle"""
+        with self._lock:
+            for plate_id in list(self._plates_by_vehicle.get(vehicle_id, ())):
+                self._remove(plate_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._plates_by_vehicle.clear()
+
+    def warm(self, db: Session):
+        """Preload the most recently updated vehicles"""
+        vehicles = (
+            db.query(Vehicle)
+            .order_by(Vehicle.updated_at.desc())
+            .limit(self.maxsize)
+            .all()
+        )
+        for vehicle in reversed(vehicles):
+            # Columns only: the relationships would lazy-load per vehicle
+            self.put(vehicle.plate_id, vehicle.to_dict(rules=("-services", "-client")))
+
+    def stats(self) -> dict:
+        """Get hit/miss counters"""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, plate_id: str):
+        vehicle_data, _ = self._entries.pop(plate_id)
+        plates = self._plates_by_vehicle.get(vehicle_data["id"])
+        if plates is not None:
+            plates.discard(plate_id)
+            if not plates:
+                del self._plates_by_vehicle[vehicle_data["id"]]
+
+
+# Global instance
+plate_cache = PlateCache(
+    maxsize=settings.PLATE_CACHE_SIZE, ttl=settings.PLATE_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,143 @@
+from threading import Lock
+from typing import Dict, NamedTuple, Optional, Set
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.plates import canonical_plate, plate_distance
+from app.models.vehicle import Vehicle
+
+
+class PlateMatch(NamedTuple):
+    plate_id: str
+    vehicle_id: int
+    cost: float
+    confidence: float
+
+
+class PlateIndex:
+    """
+    In-memory index over all known plates for OCR-tolerant matching.
+    Plates are keyed by their canonical form (confusable glyphs collapsed),
+    so O/0, I/1, B/8, S/5 misreads resolve with a single dict lookup. When
+    `max_cost` allows a full edit (>= 1) the index also stores every
+    single-deletion variant of the canonical form, which finds plates one
+    insertion, deletion or substitution away without scanning.
+    """
+
+    def __init__(self, max_cost: float = 0.5):
+        self.max_cost = max_cost
+        self._vehicles: Dict[str, int] = {}
+        self._plates_by_vehicle: Dict[int, str] = {}
+        self._keys: Dict[str, Set[str]] = {}
+        self._lock = Lock()
+        self.exact_matches = 0
+        self.fuzzy_matches = 0
+        self.ambiguous = 0
+        self.misses = 0
+
+    def _index_keys(self, plate_id: str) -> Set[str]:
+        canonical = canonical_plate(plate_id)
+        keys = {canonical}
+        if self.max_cost >= 1:
+            keys.update(canonical[:i] + canonical[i + 1 :] for i in range(len(canonical)))
+        return keys
+
+    def add(self, plate_id: str, vehicle_id: int):
+        """Index a plate (replacing any plate previously held by the vehicle)"""
+        with self._lock:
+            self._remove_vehicle(vehicle_id)
+            self._remove_plate(plate_id)
+            self._vehicles[plate_id] = vehicle_id
+            self._plates_by_vehicle[vehicle_id] = plate_id
+            for key in self._index_keys(plate_id):
+                self._keys.setdefault(key, set()).add(plate_id)
+
+    def remove_vehicle(self, vehicle_id: int):
+        with self._lock:
+            self._remove_vehicle(vehicle_id)
+
+    def clear(self):
+        with self._lock:
+            self._vehicles.clear()
+            self._plates_by_vehicle.clear()
+            self._keys.clear()
+
+    def build(self, db: Session):
+        """Load every known plate from the vehicles table"""
+        rows = db.execute(select(Vehicle.id, Vehicle.plate_id).execution_options(yield_per=10000))
+        self.clear()
+        for vehicle_id, plate_id in rows:
+            self.add(plate_id, vehicle_id)
+
+    def match(self, plate_id: str) -> Optional[PlateMatch]:
+        """
+        Resolve a normalized read to the closest known plate within
+        `max_cost`. Returns None when nothing is close enough, or when two
+        plates are equally close (guessing would merge different vehicles).
+        """
+        with self._lock:
+            vehicle_id = self._vehicles.get(plate_id)
+            if vehicle_id is not None:
+                self.exact_matches += 1
+                return PlateMatch(plate_id, vehicle_id, 0.0, 1.0)
+            if self.max_cost <= 0:
+                self.misses += 1
+                return None
+
+            candidates = set()
+            for key in self._index_keys(plate_id):
+                candidates.update(self._keys.get(key, ()))
+
+            best = None
+            tied = False
+            for candidate in candidates:
+                cost = plate_distance(plate_id, candidate)
+                if cost > self.max_cost:
+                    continue
+                if best is None or cost < best[0]:
+                    best, tied = (cost, candidate), False
+                elif cost == best[0]:
+                    tied = True
+
+            if best is None:
+                self.misses += 1
+                return None
+            if tied:
+                self.ambiguous += 1
+                return None
+
+            cost, candidate = best
+            self.fuzzy_matches += 1
+            confidence = max(0.0, 1 - cost / max(len(candidate), 1))
+            return PlateMatch(candidate, self._vehicles[candidate], cost, round(confidence, 3))
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._vehicles),
+            "max_cost": self.max_cost,
+            "exact_matches": self.exact_matches,
+            "fuzzy_matches": self.fuzzy_matches,
+            "ambiguous": self.ambiguous,
+            "misses": self.misses,
+        }
+
+    def _remove_vehicle(self, vehicle_id: int):
+        plate_id = self._plates_by_vehicle.get(vehicle_id)
+        if plate_id is not None:
+            self._remove_plate(plate_id)
+
+    def _remove_plate(self, plate_id: str):
+        vehicle_id = self._vehicles.pop(plate_id, None)
+        if vehicle_id is None:
+            return
+        self._plates_by_vehicle.pop(vehicle_id, None)
+        for key in self._index_keys(plate_id):
+            plates = self._keys.get(key)
+            if plates is not None:
+                plates.discard(plate_id)
+                if not plates:
+                    del self._keys[key]
+
+
+# Global instance
+plate_index = PlateIndex(max_cost=settings.PLATE_MATCH_MAX_COST)
@@ -0,0 +1,51 @@
+from typing import Dict
+
+# Glyphs OCR engines commonly mistake for each other. The first character of
+# each group is the canonical form.
+CONFUSABLE_GROUPS = ("0ODQ", "1IL", "2Z", "5S", "6G", "8B")
+
+# Substituting a confusable glyph is much cheaper than any other edit
+CONFUSION_COST = 0.25
+
+CANONICAL_GLYPHS: Dict[str, str] = {
+    glyph: group[0] for group in CONFUSABLE_GROUPS for glyph in group
+}
+_CANONICAL_TABLE = str.maketrans(CANONICAL_GLYPHS)
+
+
+def normalize_plate(plate_id: str) -> str:
+    """Normalize a raw plate read to the form stored in vehicles.plate_id"""
+    return "".join(ch for ch in plate_id.upper() if ch.isalnum())
+
+
+def canonical_plate(plate_id: str) -> str:
+    """Collapse confusable glyphs so that common misreads compare equal"""
+    return plate_id.translate(_CANONICAL_TABLE)
+
+
+def substitution_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    if a in CANONICAL_GLYPHS and CANONICAL_GLYPHS[a] == CANONICAL_GLYPHS.get(b):
+        return CONFUSION_COST
+    return 1.0
+
+
+def plate_distance(a: str, b: str) -> float:
+    """
+    Confusion-weighted edit distance between two normalized plates.
+    Insertions and deletions cost 1, confusable substitutions CONFUSION_COST.
+    """
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + substitution_cost(ca, cb),
+                )
+            )
+        previous = current
+    return previous[-1]
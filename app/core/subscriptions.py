@@ -0,0 +1,108 @@
+from typing import Dict, FrozenSet, Hashable, Optional, Set
+from app.schemas.service import ServiceFilter
+
+# Service event fields clients can filter on
+FILTER_FIELDS = ("kind", "vehicle_id", "client_id", "status")
+
+EMPTY: FrozenSet = frozenset()
+
+
+def event_values(data: dict) -> Dict[str, Hashable]:
+    """Extract the filterable values of a serialized service"""
+    vehicle = data.get("vehicle") or {}
+    return {
+        "kind": data.get("kind"),
+        "vehicle_id": data.get("vehicle_id"),
+        "client_id": vehicle.get("owner_id"),
+        "status": "closed" if data.get("closed_at") else "open",
+    }
+
+
+class SubscriptionIndex:
+    """
+    Predicate index over the service filters of WebSocket subscribers.
+    Each filter is compiled into per-field sets: sockets accepting a given
+    value, and sockets that do not filter on the field at all (wildcards).
+    Matching an event starts from the field with the fewest candidates and
+    intersects the other fields' sets with it, so the work is bounded by
+    that smallest candidate set rather than by the number of filtered
+    sockets, instead of a Python check per socket.
+    """
+
+    def __init__(self):
+        self.filters: Dict[Hashable, ServiceFilter] = {}
+        self._by_value: Dict[str, Dict[Hashable, Set]] = {
+            field: {} for field in FILTER_FIELDS
+        }
+        self._any: Dict[str, Set] = {field: set() for field in FILTER_FIELDS}
+
+    def set(self, subscriber: Hashable, service_filter: Optional[ServiceFilter]):
+        """Install (or with None, clear) the filter of a subscriber"""
+        self.remove(subscriber)
+        if service_filter is None or not service_filter.model_dump(exclude_none=True):
+            return
+        self.filters[subscriber] = service_filter
+        for field, values in self._compile(service_filter).items():
+            if values is None:
+                self._any[field].add(subscriber)
+                continue
+            for value in values:
+                self._by_value[field].setdefault(value, set()).add(subscriber)
+
+    def remove(self, subscriber: Hashable):
+        service_filter = self.filters.pop(subscriber, None)
+        if service_filter is None:
+            return
+        for field, values in self._compile(service_filter).items():
+            if values is None:
+                self._any[field].discard(subscriber)
+                continue
+            for value in values:
+                subscribers = self._by_value[field].get(value)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._by_value[field][value]
+
+    def match(self, data: dict) -> Set:
+        """Get the filtered subscribers whose filter accepts a service"""
+        return self.match_values(event_values(data))
+
+    def match_values(self, values: Dict[str, Hashable]) -> Set:
+        """match() on already extracted event_values()"""
+        candidates = sorted(
+            (
+                (self._any[field], self._by_value[field].get(value, EMPTY))
+                for field, value in values.items()
+            ),
+            key=lambda sets: len(sets[0]) + len(sets[1]),
+        )
+        wildcards, accepting = candidates[0]
+        matched = wildcards | accepting
+        for wildcards, accepting in candidates[1:]:
+            if not matched:
+                break
+            # Intersect without building the wildcard | accepting union
+            if accepting:
+                matched = (matched & wildcards) | (matched & accepting)
+            else:
+                matched = matched & wildcards
+        return matched
+
+    def accepts(self, subscriber: Hashable, data: dict) -> bool:
+        """Check a single subscriber (for replays, not broadcasts)"""
+        return subscriber not in self.filters or subscriber in self.match(data)
+
+    def _compile(self, service_filter: ServiceFilter) -> Dict[str, Optional[list]]:
+        return {
+            "kind": (
+                [kind.value for kind in service_filter.kind]
+                if service_filter.kind is not None
+                else None
+            ),
+            "vehicle_id": service_filter.vehicle_id,
+            "client_id": service_filter.client_id,
+            "status": (
+                [service_filter.status] if service_filter.status is not None else None
+            ),
+        }
@@ -1,68 +1,570 @@
-from typing import List, Dict, Set
+from collections import deque
+from typing import Deque, Hashable, Iterable, List, Dict, Optional, Set, Tuple, Union
 from fastapi import WebSocket, WebSocketDisconnect
-import json
+import asyncio
+import msgpack
+import orjson
+import time
 from datetime import datetime
+from uuid import uuid4
+from app.core.broker import Broker, InProcessBroker, create_broker
+from app.core.config import settings
+from app.core.subscriptions import SubscriptionIndex, event_values
+from app.schemas.service import ServiceFilter
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Wire encodings subscribers can ask for with ?encoding=...: "json" is
+# orjson-encoded text frames, "msgpack" binary frames
+ENCODINGS = ("json", "msgpack")
+
+Frame = Union[str, bytes]
+
+
+def encode(message: dict, encoding: str = "json") -> Frame:
+    """Encode a message as a text (json) or binary (msgpack) frame"""
+    if encoding == "msgpack":
+        return msgpack.packb(message, default=str)
+    return orjson.dumps(message, default=str).decode()
+
+
+class EncodedMessage:
+    """A message encoded lazily, at most once per wire encoding"""
+    
+    __slots__ = ("message", "_frames")
+    
+    def __init__(self, message: dict):
+        self.message = message
+        self._frames: Dict[str, Frame] = {}
+    
+    def frame(self, encoding: str) -> Frame:
+        frame = self._frames.get(encoding)
+        if frame is None:
+            frame = self._frames[encoding] = encode(self.message, encoding)
+        return frame
+
+
+class Connection:
+    """
+    One WebSocket client with a bounded outbound queue.
+    A writer task drains the queue, so broadcasting to the client is a
+    non-blocking enqueue and a slow link only delays its own messages.
+    When the queue is full the slow-consumer policy applies:
+    - drop_oldest: drop the oldest queued message
+    - coalesce: replace a queued message for the same entity, falling back
+      to drop_oldest when there is none
+    - disconnect: close the connection
+    """
+    
+    def __init__(
+        self,
+        websocket: WebSocket,
+        maxsize: int = 256,
+        policy: str = "drop_oldest",
+        encoding: str = "json",
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {policy}")
+        self.websocket = websocket
+        self.encoding = encoding
+        self.maxsize = maxsize
+        self.policy = policy
+        self.closed = False
+        self.evicted = False
+        # Last time the client sent anything (pongs included), and last time
+        # a frame was written to it
+        self.last_seen = time.monotonic()
+        self.last_sent = self.last_seen
+        client = getattr(websocket, "client", None)
+        self.ip = client.host if client else None
+        self._queue: Deque[Tuple[Optional[Hashable], Frame]] = deque()
+        self._ready = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+    
+    def start(self):
+        """Start the writer task on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._writer = asyncio.create_task(self._run())
+    
+    def enqueue(
+        self, message: Frame, key: Optional[Hashable] = None, bounded: bool = True
+    ) -> bool:
+        """
+        Queue a message without blocking. `key` identifies the entity the
+        message is about, for coalescing. Returns False if the connection is
+        closed (or was just closed by the disconnect policy).
+        """
+        if self.closed:
+            return False
+        if bounded and len(self._queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                self.dropped += len(self._queue) + 1
+                self.evicted = True
+                self.close()
+                return False
+            if self.policy == "coalesce" and key is not None:
+                for i, (queued_key, _) in enumerate(self._queue):
+                    if queued_key == key:
+                        self._queue[i] = (key, message)
+                        self.coalesced += 1
+                        return True
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((key, message))
+        self._wake()
+        return True
+    
+    def close(self, code: int = 1013):
+        """Stop the writer and close the socket; queued messages are discarded"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not None:
+            self._call(self._writer.cancel)
+            # 1013: try again later
+            self._call(lambda: asyncio.ensure_future(self._close_socket(code)))
+    
+    def queued(self) -> int:
+        return len(self._queue)
+    
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+    
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                _, message = self._queue.popleft()
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                else:
+                    await self.websocket.send_text(message)
+                self.sent += 1
+                self.last_sent = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Client is gone; the manager drops the connection on next broadcast
+            self.closed = True
+            self._queue.clear()
+    
+    def _wake(self):
+        self._call(self._ready.set)
+    
+    def _call(self, callback):
+        """Run a callback on the writer's loop, from any thread"""
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback()
+        else:
+            self._loop.call_soon_threadsafe(callback)
 
 
 class ConnectionManager:
     """Manager for WebSocket connections"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        queue_size: int = 256,
+        policy: str = "drop_oldest",
+        broker: Optional[Broker] = None,
+        replay_size: int = 1000,
+        coalesce_window: float = 0,
+        ping_interval: float = 20,
+        idle_timeout: float = 60,
+        max_connections: int = 1000,
+        max_connections_per_ip: int = 20,
+        require_pong: bool = False,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow-consumer policy: {policy}")
+        # Events go through the broker so every worker fans them out
+        self.broker = broker or InProcessBroker()
+        self.broker.subscribe(self._on_event)
         # Store active connections by topic
         self.active_connections: Dict[str, Set[WebSocket]] = {
             "services": set(),
             "vehicles": set(),
             "clients": set(),
+            "dashboard": set(),
             "all": set()
         }
+        # Outbound queue and writer of each socket
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.queue_size = queue_size
+        self.policy = policy
+        # Counters of connections already removed
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        # Per-topic sequence numbers and the last `replay_size` encoded
+        # events, so reconnecting clients get the deltas they missed. The
+        # epoch changes on restart (and differs per worker), which tells a
+        # client its sequence numbers are no longer valid here.
+        self.epoch = uuid4().hex[:12]
+        self.sequences: Dict[str, int] = {}
+        self.history: Dict[str, Deque[Tuple[int, EncodedMessage]]] = {}
+        self.replay_size = replay_size
+        # Optional burst coalescing: events are buffered per topic for
+        # `coalesce_window` seconds and sent as one "batch" frame, keeping
+        # only the latest change of each entity
+        self.coalesce_window = coalesce_window
+        self._pending: Dict[Tuple[str, ...], Dict[Hashable, dict]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.coalesced_events = 0
+        # Service filters of clients that asked for a subset of events
+        self.subscriptions = SubscriptionIndex()
+        # Heartbeat: every `ping_interval` seconds clients get a ping, and
+        # those idle for `idle_timeout` seconds are reaped. A client is idle
+        # when no frame could be written to it (dead peers are detected by
+        # the server's protocol-level ping/pong, which fails the writes);
+        # with `require_pong` it must also reply to pings itself.
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.require_pong = require_pong
+        self._reaper: Optional[asyncio.Task] = None
+        self.reaped = 0
+        # Connection caps
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self._per_ip: Dict[Optional[str], int] = {}
+        self.rejected = 0
+    
+    async def start(self):
+        """Start the broker and the reaper (call on application startup)"""
+        await self.broker.start()
+        self.start_reaper()
+    
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await self.flush()
+        await self.broker.stop()
+    
+    def start_reaper(self):
+        """Start the heartbeat/reaper task on the running loop (no-op if running)"""
+        if self.ping_interval <= 0:
+            return
+        if self._reaper is not None and not self._reaper.done():
+            return
+        self._reaper = asyncio.ensure_future(self._run_reaper())
+    
+    async def _run_reaper(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            self.reap_idle()
     
-    async def connect(self, websocket: WebSocket, topic: str = "all"):
-        """Connect a WebSocket client to a specific topic"""
+    def reap_idle(self) -> int:
+        """Reap dead and idle clients and ping the rest; returns the reaped count"""
+        now = time.monotonic()
+        ping = EncodedMessage({"type": "ping"})
+        reaped = 0
+        for websocket, connection in list(self.connections.items()):
+            active = connection.last_seen
+            if not self.require_pong:
+                active = max(active, connection.last_sent)
+            if connection.closed or now - active > self.idle_timeout:
+                for sockets in self.active_connections.values():
+                    sockets.discard(websocket)
+                # 1001: going away
+                self._remove(websocket, code=1001)
+                reaped += 1
+            else:
+                connection.enqueue(ping.frame(connection.encoding), bounded=False)
+        self.reaped += reaped
+        return reaped
+    
+    def touch(self, websocket: WebSocket):
+        """Record client activity (any message, including pongs)"""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+    
+    async def connect(
+        self, websocket: WebSocket, topic: str = "all", encoding: str = "json"
+    ):
+        """
+        Connect a WebSocket client to a specific topic. Clients get only the
+        events published to their topic ("all" subscribers get every event
+        published to "all"), so a topic's history covers everything its
+        clients were sent and a resume can replay it in full.
+        """
+        if encoding not in ENCODINGS:
+            # 1003: unsupported data
+            await websocket.close(code=1003)
+            raise WebSocketDisconnect(code=1003)
+        client = getattr(websocket, "client", None)
+        ip = client.host if client else None
+        if (
+            len(self.connections) >= self.max_connections
+            or self._per_ip.get(ip, 0) >= self.max_connections_per_ip
+        ):
+            self.rejected += 1
+            # 1013: try again later
+            await websocket.close(code=1013)
+            raise WebSocketDisconnect(code=1013)
         await websocket.accept()
+        connection = Connection(websocket, self.queue_size, self.policy, encoding)
+        connection.start()
+        self.connections[websocket] = connection
+        self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        self.start_reaper()
         if topic not in self.active_connections:
             self.active_connections[topic] = set()
         self.active_connections[topic].add(websocket)
-        self.active_connections["all"].add(websocket)
     
     def disconnect(self, websocket: WebSocket, topic: str = "all"):
         """Disconnect a WebSocket client from a specific topic"""
         if topic in self.active_connections:
             self.active_connections[topic].discard(websocket)
         self.active_connections["all"].discard(websocket)
+        if not any(websocket in s for s in self.active_connections.values()):
+            self._remove(websocket)
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: Frame, websocket: WebSocket):
         """Send a message to a specific WebSocket client"""
-        await websocket.send_text(message)
+        connection = self.connections.get(websocket)
+        if connection is None:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_text(message)
+            return
+        # Replies are never dropped by the slow-consumer policy
+        connection.enqueue(message, bounded=False)
     
-    async def broadcast_to_topic(self, message: dict, topic: str = "all"):
-        """Broadcast a message to all clients subscribed to a topic"""
-        message_str = json.dumps({
-            **message,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+    async def send_message(self, message: dict, websocket: WebSocket):
+        """Send a message to a client in the encoding it negotiated"""
+        connection = self.connections.get(websocket)
+        encoding = connection.encoding if connection is not None else "json"
+        await self.send_personal_message(encode(message, encoding), websocket)
+    
+    def get_recipients(self, topics: Iterable[str]) -> Set[WebSocket]:
+        """Get the unique set of clients subscribed to any of the topics"""
+        recipients: Set[WebSocket] = set()
+        for topic in topics:
+            recipients |= self.active_connections.get(topic, set())
+        return recipients
+    
+    async def broadcast(self, message: dict, topics: Iterable[str] = ("all",)):
+        """
+        Queue a message once for every client subscribed to any of the
+        topics. The message is encoded once per wire encoding in use, and a
+        client subscribed to several matching topics receives it only once.
+        """
+        topics = tuple(topics)
+        if "timestamp" not in message:
+            message = {**message, "timestamp": datetime.utcnow().isoformat()}
+        seq = {}
+        for topic in topics:
+            seq[topic] = self.sequences[topic] = self.sequences.get(topic, 0) + 1
+        encoded = EncodedMessage({**message, "epoch": self.epoch, "seq": seq})
+        for topic in topics:
+            history = self.history.setdefault(topic, deque(maxlen=self.replay_size))
+            history.append((seq[topic], encoded))
+        data = message.get("data")
+        key = (topics[0], data.get("id")) if isinstance(data, dict) else None
         
-        connections = self.active_connections.get(topic, set()).copy()
-        disconnected = set()
+        recipients = self.get_recipients(topics)
+        deliveries = [(recipients, encoded)]
+        if topics[0] == "services" and self.subscriptions.filters:
+            filtered = recipients & self.subscriptions.filters.keys()
+            deliveries = [(recipients - filtered, encoded)]
+            deliveries += self._filtered_deliveries(filtered, encoded)
         
-        for connection in connections:
-            try:
-                await connection.send_text(message_str)
-            except Exception:
-                disconnected.add(connection)
+        disconnected = set()
+        for websockets, delivered in deliveries:
+            for websocket in websockets:
+                connection = self.connections.get(websocket)
+                if connection is None or not connection.enqueue(
+                    delivered.frame(connection.encoding), key
+                ):
+                    disconnected.add(websocket)
         
         # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection, topic)
+        for websocket in disconnected:
+            for sockets in self.active_connections.values():
+                sockets.discard(websocket)
+            self._remove(websocket)
+    
+    async def publish(self, message: dict, topics: Iterable[str] = ("all",)):
+        """
+        Publish a message through the broker; each worker broadcasts it to
+        its own clients when the event comes back
+        """
+        message = {**message, "timestamp": datetime.utcnow().isoformat()}
+        await self.broker.publish({"topics": list(topics), "message": message})
+    
+    async def _on_event(self, event: dict):
+        if self.coalesce_window <= 0:
+            await self.broadcast(event["message"], event["topics"])
+            return
+        
+        topics = tuple(event["topics"])
+        message = event["message"]
+        pending = self._pending.setdefault(topics, {})
+        data = message.get("data")
+        key = data.get("id") if isinstance(data, dict) else None
+        if key is None:
+            key = object()
+        previous = pending.pop(key, None)
+        if previous is not None:
+            self.coalesced_events += 1
+            if previous.get("action") == "create" and message.get("action") == "update":
+                # Still new to the client
+                message = {**message, "action": "create"}
+                message.pop("previous", None)
+            elif "previous" in previous:
+                # Clients last saw the state before the first coalesced change
+                message = {**message, "previous": previous["previous"]}
+        pending[key] = message
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.coalesce_window)
+        self._flush_task = None
+        await self.flush()
+    
+    async def flush(self):
+        """Send the coalesced changes of each topic as one batch frame"""
+        pending, self._pending = self._pending, {}
+        for topics, changes in pending.items():
+            batch = {"type": "batch", "changes": list(changes.values())}
+            await self.broadcast(batch, topics)
     
-    async def broadcast_service_update(self, action: str, service_data: dict):
-        """Broadcast service updates to all subscribed clients"""
+    def replay(
+        self, websocket: WebSocket, topic: str, last_seq: int, epoch: Optional[str]
+    ) -> Optional[int]:
+        """
+        Queue the events of a topic a reconnecting client missed since
+        `last_seq`. Service events go through the client's current filter,
+        as installed by set_filter() before the replay, not the filter it
+        had when they were published; batches are cut down to the changes
+        it accepts. Returns how many events were queued, or None when they
+        are no longer buffered (or the epoch changed) and a snapshot is
+        needed.
+        """
+        connection = self.connections.get(websocket)
+        current = self.sequences.get(topic, 0)
+        if connection is None or epoch != self.epoch or last_seq > current:
+            return None
+        history = self.history.get(topic, ())
+        oldest = history[0][0] if history else current + 1
+        if last_seq + 1 < oldest:
+            return None
+        missed = [encoded for seq, encoded in history if seq > last_seq]
+        queued = 0
+        for encoded in missed:
+            deliveries = [({websocket}, encoded)]
+            if websocket in self.subscriptions.filters and "services" in (
+                encoded.message.get("seq") or {}
+            ):
+                deliveries = self._filtered_deliveries({websocket}, encoded)
+            for websockets, delivered in deliveries:
+                if websocket in websockets:
+                    frame = delivered.frame(connection.encoding)
+                    connection.enqueue(frame, bounded=False)
+                    queued += 1
+        return queued
+    
+    def set_filter(self, websocket: WebSocket, service_filter: Optional[ServiceFilter]):
+        """Only send this client the service events its filter accepts"""
+        if websocket in self.connections:
+            self.subscriptions.set(websocket, service_filter)
+    
+    def _filtered_deliveries(
+        self, websockets: Set[WebSocket], encoded: EncodedMessage
+    ) -> List[Tuple[Set[WebSocket], EncodedMessage]]:
+        """
+        Split a service event between filtered clients. Batches are cut down
+        to the changes each filter accepts; clients accepting the same
+        changes share one re-encoded batch. A change also goes to the
+        clients whose filter accepted the service before it (its "previous"
+        values), so they see it leave their filter.
+        """
+        message = encoded.message
+        if message.get("type") != "batch":
+            data = message.get("data")
+            if not isinstance(data, dict):
+                return [(websockets, encoded)]
+            return [(self._match_change(message) & websockets, encoded)]
+        
+        accepted: Dict[WebSocket, List[int]] = {}
+        for i, change in enumerate(message["changes"]):
+            data = change.get("data")
+            matched = (
+                self._match_change(change) & websockets
+                if isinstance(data, dict)
+                else websockets
+            )
+            for websocket in matched:
+                accepted.setdefault(websocket, []).append(i)
+        groups: Dict[Tuple[int, ...], Set[WebSocket]] = {}
+        for websocket, changes in accepted.items():
+            groups.setdefault(tuple(changes), set()).add(websocket)
+        return [
+            (
+                group,
+                EncodedMessage(
+                    {**message, "changes": [message["changes"][i] for i in changes]}
+                ),
+            )
+            for changes, group in groups.items()
+        ]
+    
+    def _match_change(self, change: dict) -> Set[WebSocket]:
+        matched = self.subscriptions.match(change["data"])
+        previous = change.get("previous")
+        if isinstance(previous, dict):
+            matched = matched | self.subscriptions.match_values(previous)
+        return matched
+    
+    async def broadcast_to_topic(self, message: dict, topic: str = "all"):
+        """Queue a message for all clients subscribed to a topic"""
+        await self.broadcast(message, (topic,))
+    
+    async def broadcast_service_update(
+        self,
+        action: str,
+        service_data: dict,
+        vehicle_created: bool = False,
+        previous: Optional[dict] = None,
+    ):
+        """
+        Broadcast service updates to all subscribed clients. `previous` is
+        the service as it was before an update; its filterable values are
+        sent along so clients filtering on them also see the service leave
+        their filter (e.g. an open service being closed).
+        """
         message = {
             "type": "update",
             "action": action,  # create, update, delete
             "data": service_data
         }
-        await self.broadcast_to_topic(message, "services")
-        await self.broadcast_to_topic(message, "all")
+        if previous is not None:
+            message["previous"] = event_values(previous)
+        if vehicle_created:
+            # The read also registered its vehicle (counted by the dashboard)
+            message["vehicle_created"] = True
+        await self.publish(message, ("services", "all"))
 
     async def broadcast_client_update(self, action: str, client_data: dict):
         """Broadcast client updates to all subscribed clients"""
@@ -71,8 +573,7 @@ class ConnectionManager:
             "action": action,  # create, update, delete
             "data": client_data
         }
-        await self.broadcast_to_topic(message, "clients")
-        await self.broadcast_to_topic(message, "all")
+        await self.publish(message, ("clients", "all"))
     
     async def broadcast_vehicle_update(self, action: str, vehicle_data: dict):
         """Broadcast vehicle updates to all subscribed clients"""
@@ -81,13 +582,63 @@ class ConnectionManager:
             "action": action,  # create, update, delete
             "data": vehicle_data
         }
-        await self.broadcast_to_topic(message, "vehicles")
-        await self.broadcast_to_topic(message, "all")
+        await self.publish(message, ("vehicles", "all"))
     
     def get_active_connections_count(self, topic: str = "all") -> int:
         """Get the number of active connections for a topic"""
         return len(self.active_connections.get(topic, set()))
+    
+    def get_connection_stats(self) -> dict:
+        """Get live, reaped and rejected connection counts"""
+        return {
+            "live": len(self.connections),
+            "reaped": self.reaped,
+            "rejected": self.rejected,
+            "max_connections": self.max_connections,
+            "max_connections_per_ip": self.max_connections_per_ip,
+        }
+    
+    def get_send_stats(self) -> dict:
+        """Get outbound queue depth and slow-consumer counters"""
+        live = list(self.connections.values())
+        return {
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "queued": sum(c.queued() for c in live),
+            "max_queued": max((c.queued() for c in live), default=0),
+            "sent": self.sent + sum(c.sent for c in live),
+            "dropped": self.dropped + sum(c.dropped for c in live),
+            "coalesced": self.coalesced + sum(c.coalesced for c in live),
+            "slow_disconnects": self.slow_disconnects,
+            "coalesced_events": self.coalesced_events,
+        }
+    
+    def _remove(self, websocket: WebSocket, code: int = 1013):
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        connection.close(code)
+        self._per_ip[connection.ip] -= 1
+        if not self._per_ip[connection.ip]:
+            del self._per_ip[connection.ip]
+        self.subscriptions.remove(websocket)
+        if connection.evicted:
+            self.slow_disconnects += 1
+        self.sent += connection.sent
+        self.dropped += connection.dropped
+        self.coalesced += connection.coalesced
 
 
 # Global instance
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    policy=settings.WS_SLOW_CONSUMER_POLICY,
+    broker=create_broker(settings.BROKER_BACKEND),
+    replay_size=settings.WS_REPLAY_BUFFER_SIZE,
+    coalesce_window=settings.WS_COALESCE_MS / 1000,
+    ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    max_connections_per_ip=settings.WS_MAX_CONNECTIONS_PER_IP,
+    require_pong=settings.WS_REQUIRE_PONG,
+)
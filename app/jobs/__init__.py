@@ -0,0 +1 @@
+# Offline maintenance jobs
@@ -0,0 +1,264 @@
+"""
+Merge near-duplicate vehicles left behind by OCR misreads.
+
+Plates are loaded into NumPy arrays and grouped by their canonical form
+(confusable glyphs collapsed, see app.core.plates), so candidate pairs come
+from one vectorized sort instead of an O(n^2) comparison. Within each group
+the vehicle with an owner, then the most services, then the lowest id is
+kept; services of the others are re-pointed to it and the duplicates are
+deleted in bulk transactions. Groups where more than one vehicle has an
+owner are not merged but reported for manual review.
+
+    python -m app.jobs.reconcile_vehicles            # dry run, report only
+    python -m app.jobs.reconcile_vehicles --apply
+
+Running API workers keep per-process plate caches; restart them after
+applying a merge.
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+import numpy as np
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.plates import CANONICAL_GLYPHS, CONFUSION_COST
+from app.models.activity_log import ActivityLog, ActionType, EntityType
+from app.models.service import Service
+from app.models.vehicle import Vehicle
+
+# Byte lookup table mapping every confusable glyph to its canonical glyph
+_CANONICAL_LUT = np.arange(256, dtype=np.uint8)
+for _glyph, _canonical in CANONICAL_GLYPHS.items():
+    _CANONICAL_LUT[ord(_glyph)] = ord(_canonical)
+
+
+def load_vehicles(db: Session) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Load vehicle ids, plates, ownership and service counts as arrays"""
+    service_counts = (
+        select(Service.vehicle_id, func.count(Service.id).label("services"))
+        .group_by(Service.vehicle_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            Vehicle.id,
+            Vehicle.plate_id,
+            Vehicle.owner_id.is_not(None),
+            func.coalesce(service_counts.c.services, 0),
+        )
+        .outerjoin(service_counts, service_counts.c.vehicle_id == Vehicle.id)
+        .execution_options(yield_per=50000)
+    ).all()
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0, dtype="S1"), np.empty(0, dtype=bool), empty
+
+    ids, plates, has_owner, services = zip(*rows)
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array([plate.encode() for plate in plates]),
+        np.array(has_owner, dtype=bool),
+        np.array(services, dtype=np.int64),
+    )
+
+
+def find_duplicates(
+    ids: np.ndarray,
+    plates: np.ndarray,
+    has_owner: np.ndarray,
+    services: np.ndarray,
+    max_cost: float = settings.PLATE_MATCH_MAX_COST,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Return (duplicate ids, surviving ids, match cost) for every vehicle that
+    should be merged into another one, plus the id groups left for manual
+    review: look-alike plates of which more than one has an owner are never
+    merged, since that would move one client's services to another's car.
+    """
+    if len(ids) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64), []
+
+    width = plates.dtype.itemsize
+    raw = plates.view(np.uint8).reshape(len(plates), width)
+    canonical = np.ascontiguousarray(_CANONICAL_LUT[raw])
+
+    # Group identical canonical rows
+    keys = canonical.view(np.dtype((np.void, width))).ravel()
+    _, group, group_size = np.unique(keys, return_inverse=True, return_counts=True)
+    group = group.ravel()
+    owners = np.bincount(group, weights=has_owner, minlength=len(group_size))
+    contested = (group_size > 1) & (owners > 1)
+    review_rows = np.flatnonzero(contested[group])
+    review_rows = review_rows[np.argsort(group[review_rows], kind="stable")]
+    splits = np.flatnonzero(np.diff(group[review_rows])) + 1
+    review = [ids[rows] for rows in np.split(review_rows, splits) if len(rows)]
+
+    candidates = np.flatnonzero((group_size[group] > 1) & ~contested[group])
+    if not len(candidates):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float64), review
+
+    # Order each group so the survivor comes first: owner, most services, lowest id
+    order = candidates[
+        np.lexsort(
+            (
+                ids[candidates],
+                -services[candidates],
+                ~has_owner[candidates],
+                group[candidates],
+            )
+        )
+    ]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = group[order[1:]] != group[order[:-1]]
+    survivor = order[first][np.cumsum(first) - 1]
+
+    duplicates = order[~first]
+    survivors = survivor[~first]
+
+    # Canonical forms are equal, so every differing byte is a confusion
+    costs = (raw[duplicates] != raw[survivors]).sum(axis=1) * CONFUSION_COST
+    keep = costs <= max_cost
+    return ids[duplicates[keep]], ids[survivors[keep]], costs[keep], review
+
+
+def merge_duplicates(
+    db: Session, duplicate_ids: np.ndarray, survivor_ids: np.ndarray, batch_size: int = 5000
+) -> int:
+    """Re-point services and delete duplicates, one transaction per batch"""
+    merged = 0
+    for start in range(0, len(duplicate_ids), batch_size):
+        dup_chunk = duplicate_ids[start : start + batch_size].tolist()
+        keep_chunk = survivor_ids[start : start + batch_size].tolist()
+
+        db.execute(
+            update(Service)
+            .where(Service.vehicle_id.in_(dup_chunk))
+            .values(vehicle_id=case(dict(zip(dup_chunk, keep_chunk)), value=Service.vehicle_id))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(Vehicle)
+            .where(Vehicle.id.in_(dup_chunk))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            insert(ActivityLog).values(
+                action_type=ActionType.UPDATE,
+                entity_type=EntityType.VEHICLE,
+                description=f"Merged {len(dup_chunk)} duplicate vehicles",
+            )
+        )
+        db.commit()
+        merged += len(dup_chunk)
+    return merged
+
+
+def reconcile(
+    db: Session,
+    apply: bool = False,
+    max_cost: float = settings.PLATE_MATCH_MAX_COST,
+    batch_size: int = 5000,
+    report_limit: int = 20,
+) -> dict:
+    """Find duplicate vehicles and optionally merge them"""
+    started = time.perf_counter()
+    ids, plates, has_owner, services = load_vehicles(db)
+    loaded = time.perf_counter()
+
+    duplicate_ids, survivor_ids, costs, review = find_duplicates(
+        ids, plates, has_owner, services, max_cost
+    )
+    matched = time.perf_counter()
+
+    # Row positions of the vehicles shown in the report
+    sample = set(duplicate_ids[:report_limit].tolist())
+    sample.update(survivor_ids[:report_limit].tolist())
+    for group in review[:report_limit]:
+        sample.update(group.tolist())
+    position = {int(ids[i]): i for i in np.flatnonzero(np.isin(ids, list(sample)))}
+
+    report = {
+        "vehicles": int(len(ids)),
+        "duplicates": int(len(duplicate_ids)),
+        "survivors": int(len(np.unique(survivor_ids))),
+        "services_to_repoint": int(services[np.isin(ids, duplicate_ids)].sum()),
+        "examples": [
+            {
+                "keep": plates[position[keep]].decode(),
+                "keep_id": keep,
+                "merge": plates[position[dup]].decode(),
+                "merge_id": dup,
+                "cost": float(cost),
+            }
+            for dup, keep, cost in zip(
+                duplicate_ids[:report_limit].tolist(),
+                survivor_ids[:report_limit].tolist(),
+                costs[:report_limit].tolist(),
+            )
+        ],
+        "owned_conflicts": len(review),
+        "review": [
+            [{"id": i, "plate": plates[position[i]].decode()} for i in group.tolist()]
+            for group in review[:report_limit]
+        ],
+        "load_seconds": round(loaded - started, 3),
+        "match_seconds": round(matched - loaded, 3),
+        "applied": apply,
+    }
+
+    if apply:
+        report["merged"] = merge_duplicates(db, duplicate_ids, survivor_ids, batch_size)
+        report["merge_seconds"] = round(time.perf_counter() - matched, 3)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--apply", action="store_true", help="merge the duplicates (default: dry run)"
+    )
+    parser.add_argument("--max-cost", type=float, default=settings.PLATE_MATCH_MAX_COST)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--report-limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        report = reconcile(
+            db,
+            apply=args.apply,
+            max_cost=args.max_cost,
+            batch_size=args.batch_size,
+            report_limit=args.report_limit,
+        )
+
+    print(
+        f"{report['vehicles']} vehicles, {report['duplicates']} duplicates of "
+        f"{report['survivors']} vehicles, {report['services_to_repoint']} services "
+        f"to re-point (load {report['load_seconds']}s, match {report['match_seconds']}s)"
+    )
+    for example in report["examples"]:
+        print(
+            f"  {example['merge']} (#{example['merge_id']}) -> "
+            f"{example['keep']} (#{example['keep_id']}) cost {example['cost']}"
+        )
+    if report["owned_conflicts"]:
+        print(
+            f"{report['owned_conflicts']} groups of look-alike plates with more "
+            f"than one owner were skipped; review them manually:"
+        )
+        for group in report["review"]:
+            print("  " + ", ".join(f"{v['plate']} (#{v['id']})" for v in group))
+    if report["applied"]:
+        print(f"Merged {report['merged']} vehicles in {report['merge_seconds']}s")
+    else:
+        print("Dry run, nothing changed. Re-run with --apply to merge.")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Enum,
+    Index,
 )
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -29,3 +30,13 @@ class Service(Base):  # , SerializerMixin):
     closed_at = Column(DateTime(timezone=True), nullable=True)
 
     vehicle = relationship("Vehicle", back_populates="services")
+
+    __table_args__ = (
+        # Open services per vehicle, for entry/exit pairing
+        Index(
+            "ix_services_open_vehicle_id",
+            vehicle_id,
+            postgresql_where=closed_at.is_(None),
+            sqlite_where=closed_at.is_(None),
+        ),
+    )
@@ -0,0 +1,25 @@
+# Frame-processing pipeline: frame source -> motion gate -> recognizer -> services
+from .motion import MotionGate
+from .pipeline import FramePipeline, ServiceSink, StageStats
+from .recognizer import PlateRead, PlateRecognizer, load_recognizer
+from .scheduler import CameraConfig, FrameRing, RecognitionScheduler
+from .sources import ArraySource, FrameSource, VideoSource
+from .voting import PassAggregator, VehiclePass
+
+__all__ = [
+    "ArraySource",
+    "CameraConfig",
+    "FrameRing",
+    "FramePipeline",
+    "FrameSource",
+    "MotionGate",
+    "PassAggregator",
+    "PlateRead",
+    "PlateRecognizer",
+    "RecognitionScheduler",
+    "ServiceSink",
+    "StageStats",
+    "VehiclePass",
+    "VideoSource",
+    "load_recognizer",
+]
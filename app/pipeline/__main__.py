@@ -0,0 +1,76 @@
+"""
+Run the frame pipeline against one camera.
+
+    python -m app.pipeline --source rtsp://localhost:8554/stream --camera-id lane-1 \\
+        --recognizer mypackage.anpr:Recognizer
+"""
+
+import argparse
+import json
+import threading
+from app.core.config import settings
+from app.pipeline import (
+    FramePipeline,
+    MotionGate,
+    PassAggregator,
+    ServiceSink,
+    VideoSource,
+    load_recognizer,
+)
+from app.schemas.service import ServiceKind
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Turn camera frames into plate reads")
+    parser.add_argument(
+        "--source", default=settings.PIPELINE_SOURCE, help="RTSP URL or video file"
+    )
+    parser.add_argument("--camera-id", default="camera-1")
+    parser.add_argument(
+        "--kind",
+        default=settings.PIPELINE_SERVICE_KIND,
+        choices=[k.value for k in ServiceKind],
+    )
+    parser.add_argument("--recognizer", default=settings.PIPELINE_RECOGNIZER)
+    parser.add_argument("--report-interval", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    pipeline = FramePipeline(
+        source=VideoSource(args.source),
+        recognizer=load_recognizer(args.recognizer),
+        sink=ServiceSink(camera_id=args.camera_id, kind=ServiceKind(args.kind)),
+        gate=MotionGate(
+            pixel_threshold=settings.PIPELINE_MOTION_THRESHOLD,
+            min_changed_ratio=settings.PIPELINE_MOTION_MIN_RATIO,
+            stride=settings.PIPELINE_MOTION_STRIDE,
+        ),
+        min_confidence=settings.PIPELINE_MIN_CONFIDENCE,
+        aggregator=(
+            PassAggregator(
+                gap=settings.PIPELINE_VOTE_GAP_SECONDS,
+                max_cost=settings.PIPELINE_VOTE_MAX_COST,
+                min_reads=settings.PIPELINE_VOTE_MIN_READS,
+            )
+            if settings.PIPELINE_VOTE_GAP_SECONDS > 0
+            else None
+        ),
+    )
+
+    done = threading.Event()
+
+    def report():
+        while not done.wait(args.report_interval):
+            print(json.dumps(pipeline.stats()))
+
+    threading.Thread(target=report, daemon=True).start()
+    try:
+        pipeline.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        done.set()
+        print(json.dumps(pipeline.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class MotionGate:
+    """
+    Drops frames that did not change since the previous one.
+    Frames are subsampled every `stride` pixels (green channel only for
+    colour frames) and compared with the previous frame; a frame passes when
+    at least `min_changed_ratio` of the sampled pixels changed by more than
+    `pixel_threshold`. Cheap enough to run on every frame without a GPU.
+    """
+
+    def __init__(
+        self,
+        pixel_threshold: int = 25,
+        min_changed_ratio: float = 0.01,
+        stride: int = 4,
+    ):
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.stride = stride
+        self._previous = None
+
+    def __call__(self, frame: np.ndarray) -> bool:
+        sample = frame[:: self.stride, :: self.stride]
+        if sample.ndim == 3:
+            sample = sample[:, :, 1 if sample.shape[2] > 1 else 0]
+        sample = sample.astype(np.int16)
+
+        previous, self._previous = self._previous, sample
+        if previous is None or previous.shape != sample.shape:
+            return True
+
+        changed = np.count_nonzero(np.abs(sample - previous) > self.pixel_threshold)
+        return changed >= self.min_changed_ratio * sample.size
+
+    def reset(self):
+        self._previous = None
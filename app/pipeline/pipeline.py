@@ -0,0 +1,214 @@
+import time
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from app.core.ingestion import broadcast_results_sync, create_services_in_session
+from app.pipeline.motion import MotionGate
+from app.pipeline.recognizer import PlateRead, PlateRecognizer
+from app.pipeline.sources import FrameSource
+from app.pipeline.voting import PassAggregator
+from app.schemas.service import ServiceCreate, ServiceKind
+
+
+class StageStats:
+    """Throughput and drop counters for one pipeline stage"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.received = 0
+        self.passed = 0
+        self.dropped = 0
+        self.seconds = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "passed": self.passed,
+            "dropped": self.dropped,
+            "busy_seconds": round(self.seconds, 3),
+            "per_second": round(self.received / self.seconds, 1) if self.seconds else 0,
+        }
+
+
+class ServiceSink:
+    """
+    Final stage: writes plate reads through the service-creation path.
+    Reads are buffered and flushed in one transaction every `batch_size`
+    reads or `flush_interval` seconds, then broadcast like API writes (to
+    reach the API workers' subscribers, run with BROKER_BACKEND=postgres).
+    A failed write or broadcast is logged and counted, and the camera keeps
+    being processed; the reads of a failed write are counted as "error".
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        kind: ServiceKind,
+        batch_size: int = 20,
+        flush_interval: float = 0.5,
+        on_result: Optional[Callable[[dict], None]] = None,
+    ):
+        self.camera_id = camera_id
+        self.kind = kind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_result = on_result
+        self._pending: List[ServiceCreate] = []
+        self._last_flush = time.monotonic()
+        self.results: Dict[str, int] = {}
+        self.write_errors = 0
+        self.broadcast_errors = 0
+
+    def add(self, read: PlateRead):
+        self._pending.append(
+            ServiceCreate(
+                plate_id=read.plate_id, kind=self.kind, camera_id=self.camera_id
+            )
+        )
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def tick(self):
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            results = create_services_in_session(pending)
+        except Exception as e:
+            print(f"Pipeline write error ({self.camera_id}): {e}")
+            self.write_errors += 1
+            self.results["error"] = self.results.get("error", 0) + len(pending)
+            return
+        for result in results:
+            self.results[result["status"]] = self.results.get(result["status"], 0) + 1
+            if self.on_result is not None:
+                self.on_result(result)
+        try:
+            broadcast_results_sync(results)
+        except Exception as e:
+            # Written already; only the live update is lost
+            print(f"Pipeline broadcast error ({self.camera_id}): {e}")
+            self.broadcast_errors += 1
+
+
+class FramePipeline:
+    """
+    Frame source -> motion gate -> plate recognizer -> pass voting ->
+    service sink. Runs synchronously in the calling thread; every stage keeps
+    throughput and drop counters. Without an aggregator every read goes
+    straight to the sink.
+    """
+
+    def __init__(
+        self,
+        source: FrameSource,
+        recognizer: PlateRecognizer,
+        sink: ServiceSink,
+        gate: Optional[MotionGate] = None,
+        min_confidence: float = 0.0,
+        aggregator: Optional[PassAggregator] = None,
+    ):
+        self.source = source
+        self.recognizer = recognizer
+        self.sink = sink
+        self.gate = gate or MotionGate()
+        self.min_confidence = min_confidence
+        self.aggregator = aggregator
+        self.source_stats = StageStats("source")
+        self.gate_stats = StageStats("motion_gate")
+        self.recognizer_stats = StageStats("recognizer")
+        self.sink_stats = StageStats("sink")
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def process(self, frame: np.ndarray, timestamp: Optional[float] = None):
+        """Push one frame through the gate, recognizer and sink"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        started = time.perf_counter()
+        self.gate_stats.received += 1
+        moving = self.gate(frame)
+        self.gate_stats.seconds += time.perf_counter() - started
+        if not moving:
+            self.gate_stats.dropped += 1
+            self.deliver([], timestamp)
+            return
+        self.gate_stats.passed += 1
+
+        started = time.perf_counter()
+        self.recognizer_stats.received += 1
+        reads = [
+            read
+            for read in self.recognizer.recognize(frame)
+            if read.confidence >= self.min_confidence
+        ]
+        self.recognizer_stats.seconds += time.perf_counter() - started
+        if reads:
+            self.recognizer_stats.passed += 1
+        else:
+            self.recognizer_stats.dropped += 1
+
+        self.deliver(reads, timestamp)
+
+    def deliver(self, reads: List[PlateRead], timestamp: float):
+        """Vote reads into passes (if enabled) and hand the results to the sink"""
+        started = time.perf_counter()
+        if self.aggregator is not None:
+            voted = []
+            for read in reads:
+                voted += self.aggregator.add(read, timestamp)
+            if not reads:
+                voted += self.aggregator.flush(timestamp)
+            reads = voted
+        for read in reads:
+            self.sink_stats.received += 1
+            self.sink.add(read)
+        self.sink.tick()
+        self.sink_stats.seconds += time.perf_counter() - started
+
+    def run(self, max_frames: Optional[int] = None):
+        """Consume the source until it ends, `stop()` is called or `max_frames`"""
+        frames = self.source.frames()
+        try:
+            while not self._stopped:
+                started = time.perf_counter()
+                frame = next(frames, None)
+                self.source_stats.seconds += time.perf_counter() - started
+                if frame is None:
+                    break
+                self.source_stats.received += 1
+                self.source_stats.passed += 1
+                self.process(frame)
+                if max_frames is not None and self.source_stats.received >= max_frames:
+                    break
+        finally:
+            if self.aggregator is not None:
+                for read in self.aggregator.close():
+                    self.sink_stats.received += 1
+                    self.sink.add(read)
+            self.sink.flush()
+            self.source.close()
+
+    def stats(self) -> dict:
+        results = dict(self.sink.results)
+        created = results.get("created", 0)
+        return {
+            "source": self.source_stats.stats(),
+            "motion_gate": self.gate_stats.stats(),
+            "recognizer": self.recognizer_stats.stats(),
+            **({"voting": self.aggregator.stats()} if self.aggregator else {}),
+            "sink": {
+                **self.sink_stats.stats(),
+                "passed": created,
+                "dropped": sum(results.values()) - created,
+                "write_errors": self.sink.write_errors,
+                "broadcast_errors": self.sink.broadcast_errors,
+                "results": results,
+            },
+        }
@@ -0,0 +1,36 @@
+import importlib
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple
+import numpy as np
+
+
+class PlateRead(NamedTuple):
+    plate_id: str
+    confidence: float
+
+
+class PlateRecognizer(ABC):
+    """
+    Base class for plate recognizers.
+    Implementations take one frame and return every plate found in it.
+    """
+
+    @abstractmethod
+    def recognize(self, frame: np.ndarray) -> List[PlateRead]:
+        pass
+
+
+def load_recognizer(path: str) -> PlateRecognizer:
+    """
+    Load a recognizer from a "package.module:attribute" path. The attribute
+    may be a PlateRecognizer instance or a class/factory returning one.
+    """
+    if not path:
+        raise RuntimeError("No plate recognizer configured (set PIPELINE_RECOGNIZER)")
+    module_name, _, attribute = path.partition(":")
+    target = getattr(importlib.import_module(module_name), attribute)
+    return (
+        target()
+        if isinstance(target, type) or not hasattr(target, "recognize")
+        else target
+    )
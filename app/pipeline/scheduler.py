@@ -0,0 +1,477 @@
+"""
+Multi-camera recognition scheduler.
+
+One decoder process per camera reads frames, applies the motion gate and
+copies surviving frames into that camera's shared-memory ring. A dispatcher
+thread hands (camera, slot) pairs to a shared pool of recognizer processes
+in weighted round-robin order, so a busy lane cannot starve the others.
+Recognizers read frames straight from shared memory (only slot indices are
+pickled) and send plate reads back to a single writer thread, which owns
+the only database connection.
+
+    python -m app.pipeline.scheduler cameras.json --recognizer pkg.module:Recognizer
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import List, Literal, Optional, Tuple, Union
+import numpy as np
+from pydantic import BaseModel
+from app.core.config import settings
+from app.pipeline.motion import MotionGate
+from app.pipeline.pipeline import ServiceSink
+from app.pipeline.recognizer import PlateRead, load_recognizer
+from app.pipeline.sources import FrameSource, VideoSource
+from app.pipeline.voting import PassAggregator
+from app.schemas.service import ServiceKind
+
+# Slot states
+FREE, WRITING, FILLED, BUSY = 0, 1, 2, 3
+
+# Per-camera counters written by the decoder process
+DECODED, GATED, DROPPED, MISMATCHED, QUEUED = range(5)
+DECODER_COUNTERS = ("decoded", "gated", "dropped", "mismatched", "queued")
+
+
+class CameraConfig(BaseModel):
+    camera_id: str
+    source: Union[str, FrameSource]
+    kind: ServiceKind = ServiceKind(settings.PIPELINE_SERVICE_KIND)
+    width: int
+    height: int
+    channels: int = 3
+    # Frames buffered in shared memory for this camera
+    slots: int = 8
+    # What to do when the ring is full: skip the new frame, overwrite the
+    # oldest frame not yet picked up, or wait (video files)
+    drop_policy: Literal["drop_newest", "drop_oldest", "block"] = "drop_newest"
+    # Frames dispatched per round-robin turn
+    weight: int = 1
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        if self.channels == 1:
+            return (self.height, self.width)
+        return (self.height, self.width, self.channels)
+
+    def open_source(self) -> FrameSource:
+        if isinstance(self.source, FrameSource):
+            return self.source
+        return VideoSource(self.source)
+
+
+class FrameRing:
+    """
+    Fixed number of frame slots in one shared-memory block. A small header
+    holds each slot's state, sequence number and capture time; transitions
+    are guarded by a process-shared lock.
+    """
+
+    def __init__(
+        self, shape: Tuple[int, ...], slots: int, lock, name: Optional[str] = None
+    ):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.lock = lock
+        self.frame_bytes = int(np.prod(self.shape))
+        self.header_bytes = slots * 3 * 8
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(
+            name=name,
+            create=self.owner,
+            size=self.header_bytes + slots * self.frame_bytes,
+        )
+        self._map()
+        if self.owner:
+            self.header[:] = 0
+
+    def _map(self):
+        self.header = np.ndarray((self.slots, 3), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray(
+            (self.slots, *self.shape),
+            dtype=np.uint8,
+            buffer=self.shm.buf,
+            offset=self.header_bytes,
+        )
+
+    def __getstate__(self):
+        # Only the block name travels to child processes
+        return {
+            "shape": self.shape,
+            "slots": self.slots,
+            "lock": self.lock,
+            "name": self.shm.name,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["shape"], state["slots"], state["lock"], name=state["name"])
+
+    def acquire_write(self, drop_oldest: bool = False) -> Tuple[Optional[int], bool]:
+        """
+        Reserve a slot for writing. Returns (slot, replaced); `replaced` means
+        an unclaimed frame was overwritten and its slot is already queued.
+        """
+        with self.lock:
+            states = self.header[:, 0]
+            free = np.flatnonzero(states == FREE)
+            if len(free):
+                slot = int(free[0])
+                self.header[slot, 0] = WRITING
+                return slot, False
+            if drop_oldest:
+                filled = np.flatnonzero(states == FILLED)
+                if len(filled):
+                    slot = int(filled[np.argmin(self.header[filled, 1])])
+                    self.header[slot, 0] = WRITING
+                    return slot, True
+            return None, False
+
+    def commit_write(self, slot: int, seq: int):
+        with self.lock:
+            self.header[slot] = (FILLED, seq, time.monotonic_ns())
+
+    def captured_at(self, slot: int) -> float:
+        """Capture time of a slot's frame, in time.monotonic() seconds"""
+        return int(self.header[slot, 2]) / 1e9
+
+    def claim(self, slot: int) -> int:
+        """Mark a filled slot busy; returns the state found"""
+        with self.lock:
+            state = int(self.header[slot, 0])
+            if state == FILLED:
+                self.header[slot, 0] = BUSY
+            return state
+
+    def release(self, slot: int):
+        with self.lock:
+            self.header[slot, 0] = FREE
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def run_decoder(index, camera: CameraConfig, ring: FrameRing, ready, counters, stop):
+    """Decoder process: source -> motion gate -> shared-memory ring"""
+    base = index * len(DECODER_COUNTERS)
+    gate = MotionGate(
+        pixel_threshold=settings.PIPELINE_MOTION_THRESHOLD,
+        min_changed_ratio=settings.PIPELINE_MOTION_MIN_RATIO,
+        stride=settings.PIPELINE_MOTION_STRIDE,
+    )
+    source = camera.open_source()
+    seq = 0
+    try:
+        for frame in source.frames():
+            if stop.is_set():
+                break
+            counters[base + DECODED] += 1
+            if not gate(frame):
+                counters[base + GATED] += 1
+                continue
+            if frame.shape != ring.shape:
+                counters[base + MISMATCHED] += 1
+                continue
+
+            slot, replaced = ring.acquire_write(camera.drop_policy == "drop_oldest")
+            while slot is None and camera.drop_policy == "block" and not stop.is_set():
+                time.sleep(0.005)
+                slot, replaced = ring.acquire_write()
+            if slot is None:
+                counters[base + DROPPED] += 1
+                continue
+            if replaced:
+                counters[base + DROPPED] += 1
+
+            ring.frames[slot] = frame
+            seq += 1
+            ring.commit_write(slot, seq)
+            if not replaced:
+                counters[base + QUEUED] += 1
+                ready.put(slot)
+    finally:
+        source.close()
+
+
+def run_recognizer(rings: List[FrameRing], recognizer_path: str, work, results):
+    """Recognizer process: reads frames in place from shared memory"""
+    recognizer = load_recognizer(recognizer_path)
+    while True:
+        item = work.get()
+        if item is None:
+            return
+        index, slot = item
+        ring = rings[index]
+        state = ring.claim(slot)
+        while state == WRITING:
+            # Being overwritten with a newer frame (drop_oldest)
+            time.sleep(0.001)
+            state = ring.claim(slot)
+        if state != FILLED:
+            results.put((index, time.monotonic(), []))
+            continue
+        captured_at = ring.captured_at(slot)
+        try:
+            reads = recognizer.recognize(ring.frames[slot])
+        except Exception as e:
+            print(f"Recognizer error: {e}")
+            reads = []
+        finally:
+            ring.release(slot)
+        reads = [(read.plate_id, read.confidence) for read in reads]
+        results.put((index, captured_at, reads))
+
+
+class RecognitionScheduler:
+    def __init__(
+        self,
+        cameras: List[CameraConfig],
+        recognizer: str,
+        workers: int = 0,
+        min_confidence: float = 0.0,
+        vote_gap: float = 0.0,
+        context=None,
+    ):
+        self.cameras = cameras
+        self.recognizer = recognizer
+        self.workers = workers or max(1, (os.cpu_count() or 1) - len(cameras))
+        self.min_confidence = min_confidence
+        self.ctx = context or multiprocessing.get_context()
+        self.rings = [
+            FrameRing(camera.shape, camera.slots, self.ctx.Lock()) for camera in cameras
+        ]
+        self.ready = [self.ctx.Queue() for _ in cameras]
+        self.work = self.ctx.Queue(maxsize=self.workers * 2)
+        self.results = self.ctx.Queue()
+        self.counters = self.ctx.Array(
+            "q", len(cameras) * len(DECODER_COUNTERS), lock=False
+        )
+        self.stop_event = self.ctx.Event()
+        self.sinks = [ServiceSink(camera.camera_id, camera.kind) for camera in cameras]
+        # One read per vehicle pass instead of one per frame
+        self.aggregators = (
+            [
+                PassAggregator(
+                    gap=vote_gap,
+                    max_cost=settings.PIPELINE_VOTE_MAX_COST,
+                    min_reads=settings.PIPELINE_VOTE_MIN_READS,
+                )
+                for _ in cameras
+            ]
+            if vote_gap > 0
+            else None
+        )
+        self.dispatched = [0] * len(cameras)
+        self.recognized = [0] * len(cameras)
+        self.reads = [0] * len(cameras)
+        self._decoders = []
+        self._pool = []
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        for index, camera in enumerate(self.cameras):
+            process = self.ctx.Process(
+                target=run_decoder,
+                args=(
+                    index,
+                    camera,
+                    self.rings[index],
+                    self.ready[index],
+                    self.counters,
+                    self.stop_event,
+                ),
+                name=f"decoder-{camera.camera_id}",
+                daemon=True,
+            )
+            process.start()
+            self._decoders.append(process)
+        for i in range(self.workers):
+            process = self.ctx.Process(
+                target=run_recognizer,
+                args=(self.rings, self.recognizer, self.work, self.results),
+                name=f"recognizer-{i}",
+                daemon=True,
+            )
+            process.start()
+            self._pool.append(process)
+        self._threads = [
+            threading.Thread(target=self._dispatch, name="dispatcher", daemon=True),
+            threading.Thread(target=self._write, name="writer", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _dispatch(self):
+        """Weighted round-robin from per-camera queues to the shared pool"""
+        while not self._stopping.is_set():
+            dispatched = False
+            for index, camera in enumerate(self.cameras):
+                for _ in range(camera.weight):
+                    try:
+                        slot = self.ready[index].get_nowait()
+                    except queue.Empty:
+                        break
+                    while not self._stopping.is_set():
+                        try:
+                            self.work.put((index, slot), timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    self.dispatched[index] += 1
+                    dispatched = True
+            if not dispatched:
+                time.sleep(0.002)
+
+    def _write(self):
+        """Single DB writer for every camera"""
+        while not self._stopping.is_set():
+            try:
+                index, captured_at, reads = self.results.get(timeout=0.1)
+            except queue.Empty:
+                for index in range(len(self.cameras)):
+                    self._deliver(index, [], time.monotonic())
+                continue
+            self.recognized[index] += 1
+            reads = [
+                PlateRead(plate_id, confidence)
+                for plate_id, confidence in reads
+                if confidence >= self.min_confidence
+            ]
+            self.reads[index] += len(reads)
+            self._deliver(index, reads, captured_at)
+
+    def _deliver(self, index: int, reads: List[PlateRead], timestamp: float):
+        if self.aggregators is not None:
+            aggregator = self.aggregators[index]
+            voted = []
+            for read in reads:
+                voted += aggregator.add(read, timestamp)
+            if not reads:
+                voted += aggregator.flush(timestamp)
+            reads = voted
+        for read in reads:
+            self.sinks[index].add(read)
+        self.sinks[index].tick()
+
+    def _queued(self) -> int:
+        return sum(
+            self.counters[i * len(DECODER_COUNTERS) + QUEUED]
+            for i in range(len(self.cameras))
+        )
+
+    def run(self, drain_timeout: float = 30):
+        """
+        Start, wait for every source to end, drain and stop. Raises
+        RuntimeError if a recognizer process dies (crash, OOM kill), or if
+        draining makes no progress for `drain_timeout` seconds.
+        """
+        self.start()
+        try:
+            for process in self._decoders:
+                while process.is_alive():
+                    self._check_pool()
+                    process.join(timeout=0.5)
+            deadline = time.monotonic() + drain_timeout
+            recognized = sum(self.recognized)
+            while recognized < self._queued():
+                self._check_pool()
+                if time.monotonic() > deadline:
+                    raise RuntimeError(
+                        f"Recognizers made no progress for {drain_timeout}s "
+                        f"with {self._queued() - recognized} frames queued"
+                    )
+                time.sleep(0.01)
+                if sum(self.recognized) != recognized:
+                    recognized = sum(self.recognized)
+                    deadline = time.monotonic() + drain_timeout
+        finally:
+            self.stop()
+
+    def _check_pool(self):
+        for process in self._pool:
+            if not process.is_alive():
+                raise RuntimeError(
+                    f"{process.name} exited with code {process.exitcode}"
+                )
+
+    def stop(self):
+        self.stop_event.set()
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        for _ in self._pool:
+            try:
+                self.work.put(None, timeout=1)
+            except queue.Full:
+                # A dead recognizer left work queued; the rest are terminated
+                break
+        for process in self._decoders + self._pool:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for index, sink in enumerate(self.sinks):
+            if self.aggregators is not None:
+                for read in self.aggregators[index].close():
+                    sink.add(read)
+            sink.flush()
+        for ring in self.rings:
+            ring.close()
+
+    def stats(self) -> dict:
+        stats = {}
+        for index, camera in enumerate(self.cameras):
+            base = index * len(DECODER_COUNTERS)
+            stats[camera.camera_id] = {
+                **{
+                    name: self.counters[base + i]
+                    for i, name in enumerate(DECODER_COUNTERS)
+                },
+                "dispatched": self.dispatched[index],
+                "recognized": self.recognized[index],
+                "reads": self.reads[index],
+                "results": dict(self.sinks[index].results),
+                **(
+                    {"voting": self.aggregators[index].stats()}
+                    if self.aggregators is not None
+                    else {}
+                ),
+            }
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run recognition for several cameras")
+    parser.add_argument("cameras", help="JSON file with a list of camera configs")
+    parser.add_argument("--recognizer", default=settings.PIPELINE_RECOGNIZER)
+    parser.add_argument("--workers", type=int, default=settings.PIPELINE_WORKERS)
+    args = parser.parse_args(argv)
+
+    with open(args.cameras) as f:
+        cameras = [CameraConfig(**camera) for camera in json.load(f)]
+
+    scheduler = RecognitionScheduler(
+        cameras,
+        args.recognizer,
+        workers=args.workers,
+        min_confidence=settings.PIPELINE_MIN_CONFIDENCE,
+        vote_gap=settings.PIPELINE_VOTE_GAP_SECONDS,
+    )
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(scheduler.stats()))
+
+
+if __name__ == "__main__":
+    main()
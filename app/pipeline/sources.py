@@ -0,0 +1,71 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator
+import numpy as np
+
+
+class FrameSource(ABC):
+    """Base class for frame sources; yields frames as NumPy arrays"""
+
+    name = "source"
+
+    @abstractmethod
+    def frames(self) -> Iterator[np.ndarray]:
+        pass
+
+    def close(self):
+        pass
+
+
+class ArraySource(FrameSource):
+    """Frames from an in-memory iterable (tests and replays)"""
+
+    name = "array"
+
+    def __init__(self, frames: Iterable[np.ndarray]):
+        self._frames = frames
+
+    def frames(self) -> Iterator[np.ndarray]:
+        yield from self._frames
+
+
+class VideoSource(FrameSource):
+    """
+    Frames from an RTSP URL (e.g. the MediaMTX `stream` path) or a local
+    video file, decoded with OpenCV. Network streams are reopened after
+    `reconnect_delay` seconds when they drop; files end at EOF.
+    """
+
+    name = "video"
+
+    def __init__(self, uri: str, reconnect_delay: float = 2):
+        self.uri = uri
+        self.reconnect_delay = reconnect_delay
+        self.is_stream = "://" in uri
+        self._capture = None
+
+    def _open(self):
+        try:
+            import cv2
+        except ImportError:
+            raise RuntimeError(
+                "VideoSource requires opencv-python (pip install opencv-python-headless)"
+            )
+        return cv2.VideoCapture(self.uri)
+
+    def frames(self) -> Iterator[np.ndarray]:
+        while True:
+            self._capture = self._open()
+            while self._capture.isOpened():
+                ok, frame = self._capture.read()
+                if not ok:
+                    break
+                yield frame
+            self._capture.release()
+            if not self.is_stream:
+                return
+            time.sleep(self.reconnect_delay)
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
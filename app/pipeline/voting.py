@@ -0,0 +1,116 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from app.core.plates import normalize_plate, plate_distance
+from app.pipeline.recognizer import PlateRead
+
+
+class VehiclePass:
+    """Reads believed to belong to one vehicle passing one camera"""
+
+    def __init__(self, read: PlateRead, timestamp: float):
+        self.reads: List[PlateRead] = []
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.plate_id = read.plate_id
+        self.add(read, timestamp)
+
+    def add(self, read: PlateRead, timestamp: float):
+        self.reads.append(read)
+        self.last_seen = max(self.last_seen, timestamp)
+
+    def vote(self) -> PlateRead:
+        """
+        Per-position, confidence-weighted character vote over the reads of
+        the most common length. The confidence is the mean share of the vote
+        won at each position, scaled by the mean OCR confidence.
+        """
+        lengths = Counter()
+        for read in self.reads:
+            lengths[len(read.plate_id)] += read.confidence
+        length = lengths.most_common(1)[0][0]
+        aligned = [read for read in self.reads if len(read.plate_id) == length]
+
+        plate = []
+        agreement = 0.0
+        for position in range(length):
+            votes: Dict[str, float] = defaultdict(float)
+            for read in aligned:
+                votes[read.plate_id[position]] += read.confidence
+            char, weight = max(votes.items(), key=lambda item: item[1])
+            plate.append(char)
+            agreement += weight / (sum(votes.values()) or 1)
+
+        mean_confidence = sum(read.confidence for read in aligned) / len(aligned)
+        confidence = agreement / max(length, 1) * mean_confidence
+        return PlateRead("".join(plate), round(confidence, 3))
+
+
+class PassAggregator:
+    """
+    Groups the reads of one camera into vehicle passes and emits a single
+    voted plate per pass once it ends. A read joins an open pass when it
+    arrives within `gap` seconds of the pass's last read and its plate is
+    within `max_cost` of the pass's first plate; otherwise it opens a new
+    pass. A pass ends after `gap` seconds without reads.
+    """
+
+    def __init__(self, gap: float = 1.5, max_cost: float = 2.0, min_reads: int = 1):
+        self.gap = gap
+        self.max_cost = max_cost
+        self.min_reads = min_reads
+        self._open: List[VehiclePass] = []
+        self.reads = 0
+        self.passes = 0
+        self.discarded = 0
+
+    def add(self, read: PlateRead, timestamp: float) -> List[PlateRead]:
+        """Add a read; returns the plates of passes that ended"""
+        ended = self.flush(timestamp)
+        read = PlateRead(normalize_plate(read.plate_id), read.confidence)
+        if not read.plate_id:
+            return ended
+        self.reads += 1
+
+        best: Optional[VehiclePass] = None
+        best_cost = self.max_cost
+        for vehicle_pass in self._open:
+            cost = plate_distance(read.plate_id, vehicle_pass.plate_id)
+            if cost <= best_cost:
+                best, best_cost = vehicle_pass, cost
+        if best is not None:
+            best.add(read, timestamp)
+        else:
+            self._open.append(VehiclePass(read, timestamp))
+        return ended
+
+    def flush(self, timestamp: float) -> List[PlateRead]:
+        """Close passes idle for longer than `gap`; returns their plates"""
+        ended = [p for p in self._open if timestamp - p.last_seen > self.gap]
+        if not ended:
+            return []
+        self._open = [p for p in self._open if timestamp - p.last_seen <= self.gap]
+        return self._emit(ended)
+
+    def close(self) -> List[PlateRead]:
+        """Close every open pass (end of stream)"""
+        ended, self._open = self._open, []
+        return self._emit(ended)
+
+    def _emit(self, ended: List[VehiclePass]) -> List[PlateRead]:
+        plates = []
+        for vehicle_pass in sorted(ended, key=lambda p: p.first_seen):
+            if len(vehicle_pass.reads) < self.min_reads:
+                self.discarded += 1
+                continue
+            self.passes += 1
+            plates.append(vehicle_pass.vote())
+        return plates
+
+    def stats(self) -> dict:
+        return {
+            "reads": self.reads,
+            "passes": self.passes,
+            "discarded": self.discarded,
+            "open": len(self._open),
+            "reads_per_pass": round(self.reads / self.passes, 2) if self.passes else 0,
+        }
@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from enum import Enum
 
 
@@ -24,6 +24,12 @@ class ServiceBase(BaseModel):
 
 class ServiceCreate(ServiceBase):
     plate_id: str
+    # Reads from the same camera are deduplicated; manual entries have none
+    camera_id: Optional[str] = None
+
+
+class ServiceBatchCreate(BaseModel):
+    reads: List[ServiceCreate] = Field(..., min_length=1, max_length=1000)
 
 
 class ServiceUpdate(BaseModel):
@@ -31,6 +37,22 @@ class ServiceUpdate(BaseModel):
     closed_at: Optional[datetime] = None
 
 
+class ServiceFilter(BaseModel):
+    """WebSocket subscription filter; unset fields match everything"""
+
+    kind: Optional[List[ServiceKind]] = None
+    vehicle_id: Optional[List[int]] = None
+    client_id: Optional[List[int]] = None
+    status: Optional[Literal["open", "closed"]] = None
+
+    @field_validator("kind", "vehicle_id", "client_id", mode="before")
+    @classmethod
+    def wrap_scalar(cls, v):
+        if v is None or isinstance(v, list):
+            return v
+        return [v]
+
+
 class ServiceInDBBase(ServiceBase):
     id: int
     vehicle_id: int
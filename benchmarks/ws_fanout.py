@@ -0,0 +1,356 @@
+"""
+Load-test the WebSocket fan-out of one API worker.
+
+The app is started in-process with uvicorn and subscribers are opened on
+/ws/services and /ws/all from separate processes, so the client side does
+not compete with the server's event loop. Service creations are then posted
+at a fixed rate and the run is reported as JSON:
+
+- delivery latency percentiles, from the event's publish timestamp to its
+  arrival at a subscriber
+- POST /service latency percentiles
+- messages delivered per second, and the share of expected deliveries
+- server memory (RSS) per connection
+- event-loop lag of the server loop while events are driven
+
+    python -m benchmarks.ws_fanout --subscribers 2000 --rate 50 --duration 30
+    python -m benchmarks.ws_fanout --database-url postgresql://localhost/anpr_bench
+
+Without --database-url a fresh SQLite database in a temp dir is used. Service
+rows are written to the database, so point it at a scratch database.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import List
+import numpy as np
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def percentiles(samples, digits: int = 2) -> dict:
+    if len(samples) == 0:
+        return {}
+    values = np.percentile(np.asarray(samples, dtype=np.float64), PERCENTILES)
+    report = {f"p{p:g}": round(float(v), digits) for p, v in zip(PERCENTILES, values)}
+    report["max"] = round(float(np.max(samples)), digits)
+    return report
+
+
+def raise_fd_limit():
+    """Allow as many open sockets as the hard limit permits"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak RSS only (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Subscriber processes
+
+
+def run_subscribers(url: str, paths: List[str], encoding: str, received, stop, out):
+    """Process entry point: hold `paths` sockets open until `stop` is set"""
+    raise_fd_limit()
+    asyncio.run(subscribe(url, paths, encoding, received, stop, out))
+
+
+async def subscribe(url: str, paths: List[str], encoding: str, received, stop, out):
+    import websockets
+
+    latencies = array("f")
+    sockets = []
+    failed = 0
+    opening = asyncio.Semaphore(100)
+
+    def decode(frame):
+        if isinstance(frame, bytes):
+            import msgpack
+
+            return msgpack.unpackb(frame)
+        return json.loads(frame)
+
+    async def open_socket(path: str):
+        nonlocal failed
+        async with opening:
+            try:
+                websocket = await websockets.connect(
+                    f"{url}{path}?encoding={encoding}", max_size=None
+                )
+                # Snapshot or connection confirmation
+                await websocket.recv()
+                sockets.append(websocket)
+            except Exception:
+                failed += 1
+
+    async def read(websocket):
+        try:
+            async for frame in websocket:
+                received_at = datetime.utcnow()
+                message = decode(frame)
+                if message.get("type") == "ping":
+                    await websocket.send('{"type": "pong"}')
+                    continue
+                if message.get("type") == "batch":
+                    changes = message["changes"]
+                elif message.get("type") == "update":
+                    changes = [message]
+                else:
+                    continue
+                for change in changes:
+                    published = datetime.fromisoformat(change["timestamp"])
+                    latency = (received_at - published).total_seconds() * 1000
+                    latencies.append(latency)
+                    received.value += 1
+        except Exception:
+            pass
+
+    await asyncio.gather(*(open_socket(path) for path in paths))
+    readers = [asyncio.create_task(read(websocket)) for websocket in sockets]
+    out.put(("ready", len(sockets), failed))
+
+    while not stop.is_set():
+        await asyncio.sleep(0.1)
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*(websocket.close() for websocket in sockets))
+    out.put(("done", latencies.tobytes()))
+
+
+# Server
+
+
+class ServerThread(threading.Thread):
+    """uvicorn on its own loop, plus a probe sampling that loop's lag"""
+
+    def __init__(self, app, host: str, port: int, probe_interval: float = 0.05):
+        super().__init__(daemon=True)
+        import uvicorn
+
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host=host, port=port, log_level="warning")
+        )
+        self.probe_interval = probe_interval
+        self.lag = array("f")
+        self.sampling = False
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.create_task(self._probe())
+        loop.run_until_complete(self.server.serve())
+
+    async def _probe(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.probe_interval)
+            overshoot = time.perf_counter() - started - self.probe_interval
+            if self.sampling:
+                self.lag.append(max(overshoot, 0) * 1000)
+
+    def wait_started(self, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("API server did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.join(timeout=10)
+
+
+# Load driver
+
+
+async def drive(base_url: str, rate: float, duration: float, kind: str) -> dict:
+    """POST service creations for unique plates at `rate` per second"""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    count = max(int(rate * duration), 1)
+    run = f"{int(time.time()) % 100000:05d}"
+    request_ms = array("f")
+    outcome = {"broadcast": 0, "failed": 0}
+
+    async def post(http, plate_id: str):
+        started = time.perf_counter()
+        try:
+            response = await http.post(
+                "/api/v1/service/", json={"plate_id": plate_id, "kind": kind}
+            )
+        except httpx.HTTPError:
+            outcome["failed"] += 1
+            return
+        request_ms.append((time.perf_counter() - started) * 1000)
+        if response.is_success and response.json().get("service", True) is not None:
+            outcome["broadcast"] += 1
+        elif not response.is_success:
+            outcome["failed"] += 1
+
+    limits = httpx.Limits(max_connections=100)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as http:
+        start = loop.time()
+        posts = []
+        for i in range(count):
+            delay = start + i / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            posts.append(asyncio.create_task(post(http, f"BN{run}{i:06d}")))
+        await asyncio.gather(*posts)
+        elapsed = loop.time() - start
+
+    return {
+        "requested": count,
+        "broadcast": outcome["broadcast"],
+        "failed": outcome["failed"],
+        "achieved_rate": round(count / elapsed, 2) if elapsed else None,
+        "request_ms": percentiles(request_ms),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test WebSocket fan-out")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument(
+        "--all-ratio",
+        type=float,
+        default=0.5,
+        help="share of subscribers on /ws/all (the rest use /ws/services)",
+    )
+    parser.add_argument("--processes", type=int, default=max(os.cpu_count() // 2, 1))
+    parser.add_argument("--rate", type=float, default=20, help="services per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--drain-timeout", type=float, default=30)
+    parser.add_argument("--kind", default="tire_shine")
+    parser.add_argument("--encoding", default="json", choices=["json", "msgpack"])
+    parser.add_argument("--database-url", help="default: fresh SQLite database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    # Settings are read at import, so configure the app before loading it
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ws_fanout.db')}"
+    )
+    os.environ["WS_MAX_CONNECTIONS"] = str(args.subscribers + 100)
+    os.environ["WS_MAX_CONNECTIONS_PER_IP"] = str(args.subscribers + 100)
+    raise_fd_limit()
+
+    url = f"ws://{args.host}:{args.port}/api/v1"
+    on_all = round(args.subscribers * args.all_ratio)
+    paths = ["/ws/all"] * on_all + ["/ws/services"] * (args.subscribers - on_all)
+    processes = max(min(args.processes, len(paths)), 1)
+    # Spawned, so subscribers neither fork the server thread nor import the app
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    out = context.Queue()
+    counters = []
+    workers = []
+    for i in range(processes):
+        received = context.Value("q", 0, lock=False)
+        worker = context.Process(
+            target=run_subscribers,
+            args=(url, paths[i::processes], args.encoding, received, stop, out),
+            daemon=True,
+        )
+        counters.append(received)
+        workers.append(worker)
+
+    from main import app
+
+    server = ServerThread(app, args.host, args.port)
+    server.start()
+    server.wait_started()
+    rss_idle = rss_bytes()
+
+    for worker in workers:
+        worker.start()
+    connected = failed = 0
+    for _ in workers:
+        _, opened, errors = out.get()
+        connected += opened
+        failed += errors
+    time.sleep(1)
+    rss_connected = rss_bytes()
+
+    server.sampling = True
+    started = time.perf_counter()
+    load = asyncio.run(
+        drive(f"http://{args.host}:{args.port}", args.rate, args.duration, args.kind)
+    )
+    expected = load["broadcast"] * connected
+    deadline = time.monotonic() + args.drain_timeout
+    while sum(c.value for c in counters) < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    server.sampling = False
+    delivered = sum(c.value for c in counters)
+    rss_loaded = rss_bytes()
+
+    stop.set()
+    latencies = array("f")
+    for _ in workers:
+        _, samples = out.get()
+        latencies.frombytes(samples)
+    for worker in workers:
+        worker.join(timeout=10)
+    server.stop()
+
+    report = {
+        "config": {
+            "subscribers": args.subscribers,
+            "ws_all": on_all,
+            "processes": processes,
+            "rate": args.rate,
+            "duration": args.duration,
+            "encoding": args.encoding,
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        },
+        "connections": {"connected": connected, "failed": failed},
+        "load": load,
+        "delivery": {
+            "expected": expected,
+            "delivered": delivered,
+            "ratio": round(delivered / expected, 4) if expected else None,
+            "messages_per_second": round(delivered / elapsed, 1),
+            "latency_ms": percentiles(latencies),
+        },
+        "memory": {
+            "rss_idle_mb": round(rss_idle / 2**20, 1),
+            "rss_connected_mb": round(rss_connected / 2**20, 1),
+            "rss_loaded_mb": round(rss_loaded / 2**20, 1),
+            "per_connection_kb": (
+                round((rss_connected - rss_idle) / connected / 1024, 1)
+                if connected
+                else None
+            ),
+        },
+        "event_loop_lag_ms": percentiles(server.lag),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import tempfile
+
+# Run the suite against a throwaway SQLite database
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.gettempdir(), 'anpr_test.db')}",
+)
+
+import pytest
+from app.core.dashboard import dashboard
+from app.core.database import Base, engine, init_db
+from app.core.dedupe import read_deduplicator
+from app.core.ingest_stream import committed_seq
+from app.core.open_services import open_services
+from app.core.plate_cache import plate_cache
+from app.core.plate_index import plate_index
+
+
+@pytest.fixture
+def db_tables():
+    init_db()
+    yield
+    Base.metadata.drop_all(bind=engine)
+    plate_cache.clear()
+    plate_index.clear()
+    read_deduplicator.clear()
+    committed_seq.clear()
+    open_services.clear()
+    dashboard.clear()
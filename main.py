@@ -2,7 +2,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1.api import api_router
-from app.core.database import init_db
+from app.core.dashboard import dashboard
+from app.core.database import SessionLocal, init_db
+from app.core.ingest_queue import ingest_queue
+from app.core.open_services import open_services
+from app.core.plate_cache import plate_cache
+from app.core.plate_index import plate_index
+from app.core.websocket import manager
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -16,6 +22,37 @@ app = FastAPI(
 @app.on_event("startup")
 def on_startup():
     init_db()
+    with SessionLocal() as db:
+        plate_cache.warm(db)
+        plate_index.build(db)
+        if settings.SERVICE_PAIRING:
+            open_services.load(db)
+
+
+@app.on_event("startup")
+async def start_ingest_queue():
+    if settings.INGEST_ASYNC:
+        ingest_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_ingest_queue():
+    await ingest_queue.stop()
+
+
+@app.on_event("startup")
+async def start_broker():
+    await manager.start()
+
+
+@app.on_event("shutdown")
+async def stop_broker():
+    await manager.stop()
+
+
+@app.on_event("shutdown")
+def stop_dashboard():
+    dashboard.stop()
 
 
 # Set all CORS enabled origins
@@ -0,0 +1,35 @@
+"""partial index on open services per vehicle
+
+Revision ID: 3c5e7a91d2b4
+Revises: 9f81066da565
+Create Date: 2026-10-17 10:12:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e7a91d2b4'
+down_revision: Union[str, Sequence[str], None] = '9f81066da565'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_services_open_vehicle_id',
+        'services',
+        ['vehicle_id'],
+        unique=False,
+        postgresql_where=sa.text('closed_at IS NULL'),
+        sqlite_where=sa.text('closed_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_services_open_vehicle_id', table_name='services')
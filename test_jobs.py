@@ -0,0 +1,68 @@
+import numpy as np
+from app.core.database import SessionLocal
+from app.jobs.reconcile_vehicles import find_duplicates, reconcile
+from app.models.service import Service
+from app.models.vehicle import Vehicle
+from app.schemas.service import ServiceKind
+
+
+def test_find_duplicates():
+    ids = np.array([1, 2, 3, 4, 5])
+    plates = np.array([b"ABC123", b"A8C123", b"ABC124", b"A8CI23", b"XYZ9"])
+    has_owner = np.array([False, True, False, False, False])
+    services = np.array([5, 1, 3, 0, 2])
+
+    duplicate_ids, survivor_ids, costs, review = find_duplicates(
+        ids, plates, has_owner, services, max_cost=0.5
+    )
+    # The owned vehicle survives; ABC124 and XYZ9 are different vehicles
+    assert sorted(zip(duplicate_ids.tolist(), survivor_ids.tolist())) == [
+        (1, 2),
+        (4, 2),
+    ]
+    assert costs.tolist() == [0.25, 0.25]
+    assert review == []
+
+
+def test_find_duplicates_skips_owned_look_alikes():
+    ids = np.array([1, 2, 3, 4])
+    plates = np.array([b"ABC123", b"A8C123", b"A8CI23", b"XYZ999"])
+    has_owner = np.array([True, True, False, False])
+    services = np.array([1, 1, 0, 0])
+
+    duplicate_ids, survivor_ids, costs, review = find_duplicates(
+        ids, plates, has_owner, services, max_cost=0.5
+    )
+    # Two clients own look-alike plates: nothing in the group is merged
+    assert duplicate_ids.tolist() == []
+    assert [group.tolist() for group in review] == [[1, 2, 3]]
+
+
+def test_reconcile_merges_duplicates(db_tables):
+    with SessionLocal() as db:
+        keep = Vehicle(plate_id="ABC123")
+        misread = Vehicle(plate_id="A8C123")
+        other = Vehicle(plate_id="XYZ999")
+        db.add_all([keep, misread, other])
+        db.flush()
+        db.add_all(
+            [
+                Service(vehicle_id=keep.id, kind=ServiceKind.TIRE_SHINE),
+                Service(vehicle_id=keep.id, kind=ServiceKind.TIRE_SHINE),
+                Service(vehicle_id=misread.id, kind=ServiceKind.ENGINE_WASH),
+                Service(vehicle_id=other.id, kind=ServiceKind.ENGINE_WASH),
+            ]
+        )
+        db.commit()
+        keep_id, other_id = keep.id, other.id
+
+        report = reconcile(db)
+        assert report["duplicates"] == 1
+        assert report["services_to_repoint"] == 1
+        assert db.query(Vehicle).count() == 3
+
+        report = reconcile(db, apply=True)
+        assert report["merged"] == 1
+        assert db.query(Vehicle).count() == 2
+        vehicle_ids = [vehicle_id for vehicle_id, in db.query(Service.vehicle_id)]
+        assert sorted(vehicle_ids) == [keep_id, keep_id, keep_id, other_id]
@@ -0,0 +1,224 @@
+import multiprocessing
+import os
+import numpy as np
+import pytest
+from app.core.database import SessionLocal
+from app.core.websocket import manager
+from app.models.service import Service
+from app.pipeline import (
+    ArraySource,
+    CameraConfig,
+    FrameRing,
+    FramePipeline,
+    MotionGate,
+    PassAggregator,
+    PlateRead,
+    PlateRecognizer,
+    RecognitionScheduler,
+    ServiceSink,
+)
+from app.schemas.service import ServiceKind
+
+
+class FakeRecognizer(PlateRecognizer):
+    def __init__(self, plates):
+        self.plates = iter(plates)
+
+    def recognize(self, frame):
+        return [PlateRead(next(self.plates), 0.9)]
+
+
+class PixelRecognizer(PlateRecognizer):
+    """Reads the plate number off the first pixel; blank frames have none"""
+
+    def recognize(self, frame):
+        if not frame[0, 0]:
+            return []
+        return [PlateRead(f"CAM{int(frame[0, 0])}", 0.9)]
+
+
+def test_motion_gate_drops_static_frames():
+    gate = MotionGate(pixel_threshold=10, min_changed_ratio=0.05, stride=2)
+    still = np.zeros((40, 60, 3), dtype=np.uint8)
+    moved = still.copy()
+    moved[10:30, 10:40] = 200
+
+    assert gate(still)
+    assert not gate(still.copy())
+    assert gate(moved)
+    assert not gate(moved.copy())
+
+
+def test_frame_pipeline_creates_services(db_tables, monkeypatch):
+    published = []
+
+    async def publish(message, topics):
+        published.append((message["action"], tuple(topics)))
+
+    monkeypatch.setattr(manager, "publish", publish)
+    still = np.zeros((40, 60), dtype=np.uint8)
+    moved = still.copy()
+    moved[:, 30:] = 255
+    frames = [still, still, still, moved, still]
+
+    pipeline = FramePipeline(
+        source=ArraySource(frames),
+        recognizer=FakeRecognizer(["ABC123", "ABC123", "XYZ789"]),
+        sink=ServiceSink(camera_id="lane-1", kind=ServiceKind.TIRE_SHINE),
+    )
+    pipeline.run()
+
+    stats = pipeline.stats()
+    assert stats["source"]["received"] == 5
+    assert stats["motion_gate"]["passed"] == 3
+    assert stats["motion_gate"]["dropped"] == 2
+    assert stats["sink"]["results"] == {"created": 2, "suppressed": 1}
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 2
+    # Broadcast like services created through the API
+    assert published == [("create", ("services", "all"))] * 2
+
+
+def test_frame_pipeline_survives_write_errors(db_tables, monkeypatch):
+    import app.pipeline.pipeline as pipeline_module
+
+    write = pipeline_module.create_services_in_session
+    calls = []
+
+    def flaky_write(reads):
+        calls.append(len(reads))
+        if len(calls) == 1:
+            raise RuntimeError("connection dropped")
+        return write(reads)
+
+    monkeypatch.setattr(pipeline_module, "create_services_in_session", flaky_write)
+    monkeypatch.setattr(manager, "publish", None)  # broadcasts fail too
+    frames = [np.full((40, 60), value, dtype=np.uint8) for value in (0, 255, 0)]
+    pipeline = FramePipeline(
+        source=ArraySource(frames),
+        recognizer=FakeRecognizer(["ABC123", "XYZ789", "QQQ111"]),
+        sink=ServiceSink(camera_id="lane-1", kind=ServiceKind.TIRE_SHINE, batch_size=1),
+    )
+    pipeline.run()
+
+    stats = pipeline.stats()
+    assert stats == pipeline.stats()
+    assert stats["source"]["received"] == 3
+    assert stats["sink"]["results"] == {"error": 1, "created": 2}
+    assert (stats["sink"]["passed"], stats["sink"]["dropped"]) == (2, 1)
+    assert stats["sink"]["write_errors"] == 1
+    assert stats["sink"]["broadcast_errors"] == 2
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 2
+
+
+def test_frame_ring_drop_oldest():
+    ring = FrameRing((2, 2), slots=2, lock=multiprocessing.Lock())
+    try:
+        first, _ = ring.acquire_write()
+        ring.commit_write(first, 1)
+        second, _ = ring.acquire_write()
+        ring.commit_write(second, 2)
+
+        assert ring.acquire_write() == (None, False)
+        assert ring.acquire_write(drop_oldest=True) == (first, True)
+    finally:
+        ring.close()
+
+
+def test_recognition_scheduler(db_tables):
+    def frames(value):
+        # Alternate with a blank frame so every plate frame passes the gate
+        for _ in range(3):
+            yield np.full((8, 8), value, dtype=np.uint8)
+            yield np.zeros((8, 8), dtype=np.uint8)
+
+    cameras = [
+        CameraConfig(
+            camera_id=f"lane-{value}",
+            source=ArraySource(list(frames(value))),
+            kind=ServiceKind.TIRE_SHINE,
+            width=8,
+            height=8,
+            channels=1,
+            drop_policy="block",
+        )
+        for value in (100, 200)
+    ]
+    scheduler = RecognitionScheduler(
+        cameras,
+        "test_pipeline:PixelRecognizer",
+        workers=2,
+        context=multiprocessing.get_context("fork"),
+    )
+    scheduler.run()
+
+    stats = scheduler.stats()
+    for camera in cameras:
+        assert stats[camera.camera_id]["queued"] == 6
+        assert stats[camera.camera_id]["recognized"] == 6
+        # Repeated reads of the same plate are suppressed per camera
+        assert stats[camera.camera_id]["results"]["created"] == 1
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 2
+
+
+class CrashingRecognizer(PlateRecognizer):
+    def recognize(self, frame):
+        os._exit(1)
+
+
+def test_recognition_scheduler_fails_when_a_recognizer_dies(db_tables):
+    camera = CameraConfig(
+        camera_id="lane-1",
+        source=ArraySource([np.full((8, 8), 100, dtype=np.uint8)] * 3),
+        kind=ServiceKind.TIRE_SHINE,
+        width=8,
+        height=8,
+        channels=1,
+        drop_policy="block",
+    )
+    scheduler = RecognitionScheduler(
+        [camera],
+        "test_pipeline:CrashingRecognizer",
+        workers=1,
+        context=multiprocessing.get_context("fork"),
+    )
+    with pytest.raises(RuntimeError, match="recognizer-0 exited with code 1"):
+        scheduler.run()
+
+
+def test_pass_aggregator_votes_one_plate_per_pass():
+    aggregator = PassAggregator(gap=1.0, max_cost=2.0)
+    reads = ["ABC123", "A8C123", "ABC128", "ABC123", "XYZ789"]
+    emitted = []
+    for t, plate_id in enumerate(reads[:4]):
+        emitted += aggregator.add(PlateRead(plate_id, 0.9), t * 0.1)
+    # A different plate in view at the same time opens its own pass
+    emitted += aggregator.add(PlateRead(reads[4], 0.8), 0.45)
+    assert emitted == []
+
+    emitted = aggregator.add(PlateRead("QQQ111", 0.9), 5.0)
+    assert [read.plate_id for read in emitted] == ["ABC123", "XYZ789"]
+    assert 0 < emitted[0].confidence < 0.9
+    assert emitted[1].confidence == 0.8
+
+    assert [read.plate_id for read in aggregator.close()] == ["QQQ111"]
+    assert aggregator.stats()["passes"] == 3
+
+
+def test_frame_pipeline_with_voting(db_tables):
+    frames = [np.full((8, 8), 0 if i % 2 else 255, dtype=np.uint8) for i in range(6)]
+    pipeline = FramePipeline(
+        source=ArraySource(frames),
+        recognizer=FakeRecognizer(["ABC123", "A8C123", "ABC123", "ABC128"] * 2),
+        sink=ServiceSink(camera_id="lane-1", kind=ServiceKind.TIRE_SHINE),
+        aggregator=PassAggregator(gap=10),
+    )
+    pipeline.run()
+
+    assert pipeline.stats()["voting"]["passes"] == 1
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 1
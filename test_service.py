@@ -0,0 +1,239 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.core.open_services import open_services
+from app.core.plate_cache import plate_cache
+from app.core.plates import CONFUSION_COST, plate_distance
+from app.models.activity_log import ActivityLog
+from app.models.service import Service
+from app.models.vehicle import Vehicle
+
+client = TestClient(app)
+
+
+def test_create_services_batch(db_tables):
+    response = client.post("/api/v1/vehicle/", json={"plate_id": "ABC123"})
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/v1/service/batch",
+        json={
+            "reads": [
+                {"plate_id": "abc-123", "kind": "tire_shine"},
+                {"plate_id": "xyz 789", "kind": "engine_wash"},
+                {"plate_id": "XYZ789", "kind": "express_wax"},
+                {"plate_id": " - ", "kind": "express_wax"},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "created", "created", "rejected"]
+    assert [r["plate_id"] for r in results] == ["ABC123", "XYZ789", "XYZ789", ""]
+    assert results[1]["service"]["vehicle_id"] == results[2]["service"]["vehicle_id"]
+    assert results[0]["service"]["vehicle"]["plate_id"] == "ABC123"
+
+    with SessionLocal() as db:
+        assert db.query(Vehicle).count() == 2
+        assert db.query(Service).count() == 3
+        assert db.query(ActivityLog).filter(ActivityLog.entity_type == "service").count() == 3
+
+
+def test_create_services_batch_rejects_empty(db_tables):
+    response = client.post("/api/v1/service/batch", json={"reads": []})
+    assert response.status_code == 422
+
+
+def test_create_service_single_transaction(db_tables):
+    client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.post(
+            "/api/v1/service/", json={"plate_id": "abc 123", "kind": "engine_wash"}
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    service = response.json()["service"]
+    assert service["kind"] == "engine_wash"
+    assert service["vehicle"]["plate_id"] == "ABC123"
+    # Vehicle comes from the plate cache: service INSERT ... RETURNING and
+    # activity log INSERT only
+    assert statements == ["INSERT", "INSERT"]
+
+
+def test_cache_miss_does_not_load_service_history(db_tables):
+    client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+    plate_cache.clear()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        responses = [
+            client.post(
+                "/api/v1/service/", json={"plate_id": plate, "kind": "tire_shine"}
+            )
+            for plate in ("ABC123", "NEW999")
+        ]
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    # Neither the known plate (cache miss) nor the new vehicle lazy-loads
+    # the vehicle's services
+    assert not [s for s in statements if s.startswith("SELECT") and "services" in s]
+    for response in responses:
+        vehicle = response.json()["service"]["vehicle"]
+        assert "services" not in vehicle
+        assert "client" not in vehicle
+
+
+def test_create_service_rejects_empty_plate(db_tables):
+    response = client.post("/api/v1/service/", json={"plate_id": " ", "kind": "tire_shine"})
+    assert response.status_code == 422
+
+
+def test_plate_cache_invalidated_by_vehicle_update(db_tables):
+    misses = client.get("/api/v1/service/ingest/stats").json()["plate_cache"]["misses"]
+    response = client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+    vehicle_id = response.json()["service"]["vehicle_id"]
+
+    client.put(f"/api/v1/vehicle/{vehicle_id}", json={"plate_id": "ABC124"})
+    response = client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+    assert response.json()["service"]["vehicle_id"] != vehicle_id
+
+    stats = client.get("/api/v1/service/ingest/stats").json()["plate_cache"]
+    assert stats["misses"] == misses + 2
+
+
+def test_duplicate_reads_suppressed_per_camera(db_tables):
+    reads = [
+        {"plate_id": "ABC123", "kind": "tire_shine", "camera_id": "lane-1"},
+        {"plate_id": "abc 123", "kind": "tire_shine", "camera_id": "lane-1"},
+        {"plate_id": "ABC123", "kind": "tire_shine", "camera_id": "lane-2"},
+        {"plate_id": "ABC123", "kind": "tire_shine"},
+    ]
+    response = client.post("/api/v1/service/batch", json={"reads": reads})
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "suppressed", "created", "created"]
+
+    response = client.post("/api/v1/service/", json=reads[0])
+    assert response.json()["message"] == "duplicate read suppressed"
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 3
+
+
+def test_ocr_misread_matches_known_plate(db_tables):
+    client.post("/api/v1/vehicle/", json={"plate_id": "ABC123"})
+    with SessionLocal() as db:
+        vehicle_id = db.query(Vehicle.id).filter(Vehicle.plate_id == "ABC123").scalar()
+
+    response = client.post(
+        "/api/v1/service/batch",
+        json={
+            "reads": [
+                {"plate_id": "A8C-I23", "kind": "tire_shine"},
+                {"plate_id": "ABC124", "kind": "tire_shine"},
+            ]
+        },
+    )
+    matched, different = response.json()["results"]
+    assert matched["plate_id"] == "ABC123"
+    assert matched["read_plate_id"] == "A8CI23"
+    assert 0 < matched["match_confidence"] < 1
+    assert matched["service"]["vehicle_id"] == vehicle_id
+    assert different["service"]["vehicle_id"] != vehicle_id
+
+
+def test_plate_distance():
+    assert plate_distance("ABC123", "ABC123") == 0
+    assert plate_distance("ABC123", "A8C1Z3") == 2 * CONFUSION_COST
+    assert plate_distance("ABC123", "ABC124") == 1
+    assert plate_distance("ABC123", "ABC1234") == 1
+
+
+def test_create_service_write_behind(db_tables, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_ASYNC", True)
+    reads = [{"plate_id": f"ABC{i}", "kind": "tire_shine"} for i in range(5)]
+
+    # Shutdown flushes whatever is still queued
+    with TestClient(app) as async_client:
+        for read in reads:
+            response = async_client.post("/api/v1/service/", json=read)
+            assert response.status_code == 202
+            assert response.json()["id"]
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 5
+
+    stats = client.get("/api/v1/service/ingest/stats").json()["queue"]
+    assert stats["depth"] == 0
+    assert stats["flushed"] >= 5
+
+
+def test_entry_exit_pairing(db_tables, monkeypatch):
+    monkeypatch.setattr(settings, "SERVICE_PAIRING", True)
+    monkeypatch.setattr(settings, "EXIT_CAMERA_IDS", ["exit"])
+
+    response = client.post(
+        "/api/v1/service/batch",
+        json={
+            "reads": [
+                {"plate_id": "ABC123", "kind": "tire_shine"},
+                {"plate_id": "XYZ789", "kind": "tire_shine"},
+                # Second read of the same plate closes the service it opened
+                {"plate_id": "ABC123", "kind": "tire_shine"},
+                {"plate_id": "QQQ111", "kind": "tire_shine", "camera_id": "exit"},
+            ]
+        },
+    )
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == [
+        "created",
+        "created",
+        "closed",
+        "unpaired",
+    ]
+    assert results[2]["service"]["id"] == results[0]["service"]["id"]
+    assert results[2]["service"]["closed_at"] is not None
+
+    response = client.get("/api/v1/service/open")
+    open_ids = [service["id"] for service in response.json()["services"]]
+    assert open_ids == [results[1]["service"]["id"]]
+
+    # Exit camera closes the open service found through the in-memory map
+    response = client.post(
+        "/api/v1/service/",
+        json={"plate_id": "XYZ789", "kind": "tire_shine", "camera_id": "exit"},
+    )
+    assert response.json()["message"] == "service closed"
+    assert response.json()["service"]["id"] == results[1]["service"]["id"]
+    assert client.get("/api/v1/service/open").json()["services"] == []
+
+    # A re-read after the exit opens a new visit
+    response = client.post(
+        "/api/v1/service/", json={"plate_id": "XYZ789", "kind": "tire_shine"}
+    )
+    assert response.json()["message"] == "service created"
+
+    # A service opened by another worker (absent from this worker's map) is
+    # found on the open-services index and closed, not duplicated
+    open_services.clear()
+    response = client.post(
+        "/api/v1/service/", json={"plate_id": "XYZ789", "kind": "tire_shine"}
+    )
+    assert response.json()["message"] == "service closed"
+    assert client.get("/api/v1/service/open").json()["services"] == []
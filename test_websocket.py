@@ -0,0 +1,630 @@
+import asyncio
+import json
+from contextlib import ExitStack
+import msgpack
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+from main import app
+from app.core.database import SessionLocal, engine
+from app.core.broker import Broker
+from app.core.config import settings
+from app.core.dashboard import dashboard, query_counts
+from app.core.logger import create_log
+from app.core.subscriptions import SubscriptionIndex
+from app.core.websocket import Connection, ConnectionManager
+from app.models.activity_log import ActionType, ActivityLog, EntityType
+from app.models.client import Client
+from app.models.service import Service
+from app.schemas.service import ServiceFilter
+
+client = TestClient(app)
+
+
+def test_ingest_stream_acks_by_sequence(db_tables):
+    path = "/api/v1/ws/ingest?camera_id=lane-9&session=boot-1"
+    with client.websocket_connect(path) as websocket:
+        websocket.send_text(json.dumps({"seq": 1, "plate_id": "ABC123", "kind": "tire_shine"}))
+        ack = websocket.receive_json()
+        assert ack["type"] == "ack"
+        assert ack["seq"] == 1
+        assert ack["status"] == "created"
+
+        websocket.send_text(json.dumps({"seq": 2, "plate_id": "ABC123", "kind": "bogus"}))
+        ack = websocket.receive_json()
+        assert (ack["seq"], ack["status"]) == (2, "error")
+
+    # Reconnect and resend: already committed events are not written twice
+    with client.websocket_connect(path) as websocket:
+        websocket.send_text(json.dumps({"seq": 1, "plate_id": "ABC123", "kind": "tire_shine"}))
+        ack = websocket.receive_json()
+        assert (ack["seq"], ack["status"]) == (1, "duplicate")
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 1
+
+
+def test_ingest_stream_without_session_skips_seq_dedupe(db_tables):
+    def read(seq, plate_id):
+        return json.dumps({"seq": seq, "plate_id": plate_id, "kind": "tire_shine"})
+
+    path = "/api/v1/ws/ingest?camera_id=lane-9"
+    with client.websocket_connect(path) as websocket:
+        websocket.send_text(read(1, "ABC123"))
+        assert websocket.receive_json()["status"] == "created"
+
+    # The camera rebooted and numbers from 1 again, without a session
+    with client.websocket_connect(path) as websocket:
+        websocket.send_text(read(1, "XYZ789"))
+        assert websocket.receive_json()["status"] == "created"
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 2
+
+
+def test_ingest_stream_resend_after_failed_batch(db_tables, monkeypatch):
+    import app.core.ingest_stream as ingest_stream
+
+    write = ingest_stream.create_services_in_session
+
+    def failing_write(reads):
+        raise RuntimeError("database down")
+
+    def read(seq, plate_id):
+        return json.dumps({"seq": seq, "plate_id": plate_id, "kind": "tire_shine"})
+
+    path = "/api/v1/ws/ingest?camera_id=lane-9&session=boot-1"
+    with client.websocket_connect(path) as websocket:
+        monkeypatch.setattr(ingest_stream, "create_services_in_session", failing_write)
+        websocket.send_text(read(1, "ABC123"))
+        assert websocket.receive_json()["status"] == "error"
+
+        monkeypatch.setattr(ingest_stream, "create_services_in_session", write)
+        websocket.send_text(read(2, "XYZ789"))
+        assert websocket.receive_json()["status"] == "created"
+
+        # The failed read is written when resent, though a later seq committed
+        websocket.send_text(read(1, "ABC123"))
+        assert websocket.receive_json()["status"] == "created"
+        websocket.send_text(read(2, "XYZ789"))
+        assert websocket.receive_json()["status"] == "duplicate"
+
+        websocket.send_text(read("3", "QQQ111"))
+        ack = websocket.receive_json()
+        assert (ack["status"], ack["error"]) == ("error", "seq must be an integer")
+
+    # After a reboot the camera numbers from 1 again under a new session
+    path = "/api/v1/ws/ingest?camera_id=lane-9&session=boot-2"
+    with client.websocket_connect(path) as websocket:
+        websocket.send_text(read(1, "QQQ111"))
+        assert websocket.receive_json()["status"] == "created"
+
+    with SessionLocal() as db:
+        assert db.query(Service).count() == 3
+
+
+class SlowWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.release = asyncio.Event()
+
+    async def send_text(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_slow_consumer_policies():
+    async def fill(policy):
+        websocket = SlowWebSocket()
+        connection = Connection(websocket, maxsize=2, policy=policy)
+        connection.start()
+        connection.enqueue("0", key="x")
+        await asyncio.sleep(0)
+        # The writer is stuck sending "0"; the queue holds two, the rest overflow
+        for i, key in enumerate(["a", "b", "b", "d"], start=1):
+            connection.enqueue(str(i), key=key)
+        websocket.release.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        connection.close()
+        await asyncio.sleep(0)
+        return websocket, connection
+
+    websocket, connection = asyncio.run(fill("drop_oldest"))
+    assert websocket.sent == ["0", "3", "4"]
+    assert connection.dropped == 2
+
+    websocket, connection = asyncio.run(fill("coalesce"))
+    assert websocket.sent == ["0", "3", "4"]
+    assert (connection.coalesced, connection.dropped) == (1, 1)
+
+    websocket, connection = asyncio.run(fill("disconnect"))
+    assert connection.evicted
+    assert websocket.closed_with == 1013
+    assert connection.enqueue("5") is False
+
+
+def test_service_updates_fan_out(db_tables):
+    with client.websocket_connect("/api/v1/ws/services") as websocket:
+        assert websocket.receive_json()["type"] == "initial_data"
+        client.post(
+            "/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"}
+        )
+        update = websocket.receive_json()
+        assert (update["type"], update["action"]) == ("update", "create")
+        assert update["data"]["vehicle"]["plate_id"] == "ABC123"
+
+        # Subscribed to "services" and "all", but each event arrives once
+        client.post(
+            "/api/v1/service/", json={"plate_id": "XYZ789", "kind": "tire_shine"}
+        )
+        update = websocket.receive_json()
+        assert update["data"]["vehicle"]["plate_id"] == "XYZ789"
+
+    stats = client.get("/api/v1/ws/stats").json()["send_queues"]
+    assert stats["sent"] >= 3
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+
+
+def test_broker_fans_out_across_workers():
+    # Stands in for Postgres LISTEN/NOTIFY between two workers
+    class SharedBus(Broker):
+        workers = []
+
+        async def publish(self, event):
+            self.published += 1
+            for broker in self.workers:
+                await broker.dispatch(json.loads(json.dumps(event)))
+
+    async def run():
+        worker_a, worker_b = SharedBus(), SharedBus()
+        SharedBus.workers = [worker_a, worker_b]
+        manager_a = ConnectionManager(broker=worker_a)
+        manager_b = ConnectionManager(broker=worker_b)
+        websocket = FakeWebSocket()
+        await manager_b.connect(websocket, topic="services")
+
+        await manager_a.broadcast_service_update("create", {"id": 1})
+        await asyncio.sleep(0)
+        manager_b.disconnect(websocket, topic="services")
+        return websocket.sent, worker_a, worker_b
+
+    sent, worker_a, worker_b = asyncio.run(run())
+    assert [(m["action"], m["data"]) for m in sent] == [("create", {"id": 1})]
+    assert (worker_a.published, worker_b.delivered) == (1, 1)
+
+
+def test_snapshot_sockets_do_not_hold_pool_connections(db_tables):
+    # More dashboards than the pool has connections (size + overflow)
+    sockets = engine.pool.size() + engine.pool._max_overflow + 1
+    paths = ["/api/v1/ws/services", "/api/v1/ws/vehicles", "/api/v1/ws/clients"]
+    with ExitStack() as stack:
+        for i in range(sockets):
+            websocket = stack.enter_context(client.websocket_connect(paths[i % 3]))
+            assert websocket.receive_json()["type"] == "initial_data"
+        assert engine.pool.checkedout() == 0
+
+        response = client.get("/api/v1/service/")
+        assert response.status_code == 200
+
+
+def test_snapshot_pages_by_cursor(db_tables, monkeypatch):
+    monkeypatch.setattr(settings, "WS_SNAPSHOT_PAGE_SIZE", 2)
+    reads = [{"plate_id": f"ABC{i}", "kind": "tire_shine"} for i in range(5)]
+    client.post("/api/v1/service/batch", json={"reads": reads})
+
+    with client.websocket_connect("/api/v1/ws/services") as websocket:
+        page = websocket.receive_json()
+        assert page["type"] == "initial_data"
+        ids = [service["id"] for service in page["data"]]
+        while page["has_more"]:
+            websocket.send_text(json.dumps({"type": "more", "cursor": page["cursor"]}))
+            page = websocket.receive_json()
+            assert page["type"] == "snapshot_page"
+            ids += [service["id"] for service in page["data"]]
+
+        websocket.send_text(json.dumps({"type": "more", "cursor": "x"}))
+        assert websocket.receive_json()["type"] == "error"
+
+    # Newest first, every row exactly once
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 5
+
+
+def test_reconnect_replays_missed_events(db_tables):
+    def create(plate_id):
+        client.post(
+            "/api/v1/service/", json={"plate_id": plate_id, "kind": "tire_shine"}
+        )
+
+    with client.websocket_connect("/api/v1/ws/services") as websocket:
+        snapshot = websocket.receive_json()
+        epoch, last_seq = snapshot["epoch"], snapshot["seq"]
+        create("ABC123")
+        update = websocket.receive_json()
+        assert update["seq"]["services"] == last_seq + 1
+        last_seq = update["seq"]["services"]
+
+    create("XYZ789")
+    create("QQQ111")
+    path = f"/api/v1/ws/services?epoch={epoch}&last_seq={last_seq}"
+    with client.websocket_connect(path) as websocket:
+        missed = [websocket.receive_json() for _ in range(2)]
+        assert [m["data"]["vehicle"]["plate_id"] for m in missed] == [
+            "XYZ789",
+            "QQQ111",
+        ]
+        resumed = websocket.receive_json()
+        assert resumed["type"] == "resumed"
+        assert resumed["seq"] == last_seq + 2
+
+    # The replay goes through the filter the client reconnects with
+    create("ABC123")
+    client.post("/api/v1/service/", json={"plate_id": "QQQ111", "kind": "engine_wash"})
+    path = f"/api/v1/ws/services?epoch={epoch}&last_seq={last_seq + 2}&kind=engine_wash"
+    with client.websocket_connect(path) as websocket:
+        missed = websocket.receive_json()
+        assert missed["data"]["kind"] == "engine_wash"
+        resumed = websocket.receive_json()
+        assert resumed["type"] == "resumed"
+        assert resumed["replayed"] == 1
+
+    # Unknown epoch (e.g. after a restart) falls back to a snapshot
+    path = f"/api/v1/ws/services?epoch=stale&last_seq={last_seq}"
+    with client.websocket_connect(path) as websocket:
+        assert websocket.receive_json()["type"] == "initial_data"
+
+
+def test_resume_across_events_of_other_topics(db_tables):
+    def create_service(plate_id):
+        client.post(
+            "/api/v1/service/", json={"plate_id": plate_id, "kind": "tire_shine"}
+        )
+
+    with client.websocket_connect("/api/v1/ws/services") as services:
+        snapshot = services.receive_json()
+        epoch, services_seq = snapshot["epoch"], snapshot["seq"]
+        with client.websocket_connect("/api/v1/ws/all") as everything:
+            all_seq = everything.receive_json()["seq"]
+            # Vehicle events go to /ws/all only, never to /ws/services
+            client.post("/api/v1/vehicle/", json={"plate_id": "VVV111"})
+            create_service("ABC123")
+            assert everything.receive_json()["data"]["plate_id"] == "VVV111"
+            assert everything.receive_json()["data"]["kind"] == "tire_shine"
+        assert services.receive_json()["data"]["vehicle"]["plate_id"] == "ABC123"
+
+    client.post("/api/v1/vehicle/", json={"plate_id": "VVV222"})
+    create_service("XYZ789")
+
+    # Each resume replays everything its topic would have delivered live
+    path = f"/api/v1/ws/services?epoch={epoch}&last_seq={services_seq + 1}"
+    with client.websocket_connect(path) as services:
+        assert services.receive_json()["data"]["vehicle"]["plate_id"] == "XYZ789"
+        assert services.receive_json()["type"] == "resumed"
+    path = f"/api/v1/ws/all?epoch={epoch}&last_seq={all_seq + 2}"
+    with client.websocket_connect(path) as everything:
+        assert everything.receive_json()["data"]["plate_id"] == "VVV222"
+        assert everything.receive_json()["data"]["kind"] == "tire_shine"
+        assert everything.receive_json()["replayed"] == 2
+
+
+def test_coalescing_batches_bursts():
+    async def run():
+        manager = ConnectionManager(coalesce_window=0.01)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, topic="services")
+        await manager.broadcast_service_update("create", {"id": 1, "kind": "a"})
+        await manager.broadcast_service_update("update", {"id": 1, "kind": "b"})
+        await manager.broadcast_service_update("create", {"id": 2, "kind": "a"})
+        await asyncio.sleep(0.05)
+        manager.disconnect(websocket, topic="services")
+        return websocket.sent, manager
+
+    sent, manager = asyncio.run(run())
+    assert len(sent) == 1
+    assert sent[0]["type"] == "batch"
+    changes = [(c["action"], c["data"]) for c in sent[0]["changes"]]
+    assert changes == [
+        ("create", {"id": 1, "kind": "b"}),
+        ("create", {"id": 2, "kind": "a"}),
+    ]
+    assert manager.coalesced_events == 1
+
+
+def test_encoding_negotiation(db_tables):
+    with client.websocket_connect("/api/v1/ws/services?encoding=msgpack") as websocket:
+        snapshot = msgpack.unpackb(websocket.receive_bytes())
+        assert snapshot["type"] == "initial_data"
+
+        # Events are binary frames too, with the same content as json
+        client.post(
+            "/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"}
+        )
+        update = msgpack.unpackb(websocket.receive_bytes())
+        assert update["type"] == "update"
+        assert update["data"]["vehicle"]["plate_id"] == "ABC123"
+        assert update["seq"]["services"] == snapshot["seq"] + 1
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/api/v1/ws/services?encoding=xml"):
+            pass
+
+
+def test_events_encoded_once_per_encoding():
+    class RawWebSocket(FakeWebSocket):
+        async def send_text(self, message):
+            self.sent.append(message)
+
+        async def send_bytes(self, message):
+            self.sent.append(message)
+
+    async def run():
+        manager = ConnectionManager()
+        sockets = [RawWebSocket() for _ in range(3)]
+        await manager.connect(sockets[0], topic="services")
+        await manager.connect(sockets[1], topic="all")
+        await manager.connect(sockets[2], topic="services", encoding="msgpack")
+        await manager.broadcast_service_update("create", {"id": 1})
+        await asyncio.sleep(0)
+        return sockets
+
+    json_a, json_b, binary = [ws.sent[0] for ws in asyncio.run(run())]
+    assert json_a is json_b
+    assert isinstance(binary, bytes)
+    assert msgpack.unpackb(binary) == json.loads(json_a)
+
+
+def test_subscription_index():
+    index = SubscriptionIndex()
+    index.set("washes", ServiceFilter(kind="engine_wash"))
+    index.set("client-7-open", ServiceFilter(client_id=[7], status="open"))
+    index.set("everything", ServiceFilter())
+    assert index.filters.keys() == {"washes", "client-7-open"}
+
+    service = {"kind": "engine_wash", "vehicle_id": 1, "vehicle": {"owner_id": 7}}
+    assert index.match(service) == {"washes", "client-7-open"}
+    assert index.match({**service, "closed_at": "2026-01-01"}) == {"washes"}
+    assert index.match({**service, "kind": "tire_shine"}) == {"client-7-open"}
+
+    index.remove("client-7-open")
+    assert index.match(service) == {"washes"}
+    index.remove("washes")
+    assert index.match(service) == set()
+
+    # Wildcard-heavy fields are narrowed by the most selective one
+    for i in range(100):
+        index.set(i, ServiceFilter(vehicle_id=[i]))
+    assert index.match({**service, "vehicle_id": 42}) == {42}
+    index.set("washes", ServiceFilter(kind="engine_wash"))
+    assert index.match({**service, "vehicle_id": 42}) == {42, "washes"}
+
+
+def test_filtered_service_subscription(db_tables):
+    client.post(
+        "/api/v1/service/batch",
+        json={
+            "reads": [
+                {"plate_id": "ABC123", "kind": "tire_shine"},
+                {"plate_id": "XYZ789", "kind": "engine_wash"},
+            ]
+        },
+    )
+    with client.websocket_connect("/api/v1/ws/services?kind=engine_wash") as websocket:
+        snapshot = websocket.receive_json()
+        assert [s["kind"] for s in snapshot["data"]] == ["engine_wash"]
+
+        for kind in ("tire_shine", "engine_wash"):
+            client.post("/api/v1/service/", json={"plate_id": "QQQ111", "kind": kind})
+        assert websocket.receive_json()["data"]["kind"] == "engine_wash"
+
+        websocket.send_text(json.dumps({"type": "filter", "filter": {}}))
+        assert websocket.receive_json() == {"type": "filter", "filter": {}}
+        client.post(
+            "/api/v1/service/", json={"plate_id": "QQQ111", "kind": "tire_shine"}
+        )
+        assert websocket.receive_json()["data"]["kind"] == "tire_shine"
+
+
+def test_filtered_subscribers_see_services_leave_their_filter(db_tables):
+    response = client.post(
+        "/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"}
+    )
+    service_id = response.json()["service"]["id"]
+    path = "/api/v1/ws/services?status=open&kind=tire_shine"
+    with client.websocket_connect(path) as websocket:
+        assert [s["id"] for s in websocket.receive_json()["data"]] == [service_id]
+
+        # open -> closed: delivered although the service no longer matches
+        closed_at = "2026-01-01T10:00:00"
+        client.put(f"/api/v1/service/{service_id}", json={"closed_at": closed_at})
+        update = websocket.receive_json()
+        assert update["data"]["id"] == service_id
+        assert update["data"]["closed_at"] is not None
+        assert update["previous"]["status"] == "open"
+
+        # Once closed, later changes are of no interest to this client
+        client.put(f"/api/v1/service/{service_id}", json={"kind": "engine_wash"})
+        client.post(
+            "/api/v1/service/", json={"plate_id": "XYZ789", "kind": "tire_shine"}
+        )
+        assert websocket.receive_json()["data"]["vehicle"]["plate_id"] == "XYZ789"
+
+
+def test_filtered_batches_keep_matching_changes():
+    async def run():
+        manager = ConnectionManager(coalesce_window=0.01)
+        everything, washes = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(everything, topic="services")
+        await manager.connect(washes, topic="services")
+        manager.set_filter(washes, ServiceFilter(kind="engine_wash"))
+        await manager.broadcast_service_update(
+            "create", {"id": 1, "kind": "tire_shine"}
+        )
+        await manager.broadcast_service_update(
+            "create", {"id": 2, "kind": "engine_wash"}
+        )
+        await asyncio.sleep(0.05)
+        return everything.sent, washes.sent
+
+    everything, washes = asyncio.run(run())
+    assert [c["data"]["id"] for c in everything[0]["changes"]] == [1, 2]
+    assert [c["data"]["id"] for c in washes[0]["changes"]] == [2]
+
+
+def test_coalesced_updates_keep_the_first_previous_state():
+    async def run():
+        manager = ConnectionManager(coalesce_window=0.01)
+        washes = FakeWebSocket()
+        await manager.connect(washes, topic="services")
+        manager.set_filter(washes, ServiceFilter(kind="engine_wash"))
+        # engine_wash -> tire_shine -> express_wax within one window
+        changes = [("engine_wash", "tire_shine"), ("tire_shine", "express_wax")]
+        for previous, kind in changes:
+            await manager.broadcast_service_update(
+                "update", {"id": 1, "kind": kind}, previous={"id": 1, "kind": previous}
+            )
+        await asyncio.sleep(0.05)
+        return washes.sent
+
+    (batch,) = asyncio.run(run())
+    (change,) = batch["changes"]
+    assert change["data"]["kind"] == "express_wax"
+    assert change["previous"]["kind"] == "engine_wash"
+
+
+def test_idle_clients_reaped():
+    async def run(require_pong):
+        manager = ConnectionManager(
+            ping_interval=0, idle_timeout=0.05, require_pong=require_pong
+        )
+        idle, alive, listening = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for websocket in (idle, alive, listening):
+            await manager.connect(websocket, topic="services")
+        await asyncio.sleep(0.1)
+        manager.touch(alive)
+        # A read-only client that is still being written to
+        await manager.send_message({"type": "update"}, listening)
+        await asyncio.sleep(0)
+        reaped = manager.reap_idle()
+        await asyncio.sleep(0)
+        return manager, reaped, idle, alive, listening
+
+    manager, reaped, idle, alive, listening = asyncio.run(run(False))
+    assert reaped == 1
+    assert idle.closed_with == 1001
+    assert alive.sent == [{"type": "ping"}]
+    assert listening.closed_with is None
+    assert manager.get_connection_stats()["live"] == 2
+    assert manager.get_active_connections_count("services") == 2
+
+    # Opt-in: clients must answer pings themselves
+    manager, reaped, idle, alive, listening = asyncio.run(run(True))
+    assert reaped == 2
+    assert listening.closed_with == 1001
+    assert manager.get_connection_stats()["live"] == 1
+
+
+def test_connection_caps():
+    async def run():
+        manager = ConnectionManager(ping_interval=0, max_connections_per_ip=1)
+        await manager.connect(FakeWebSocket(), topic="services")
+        rejected = FakeWebSocket()
+        with pytest.raises(WebSocketDisconnect):
+            await manager.connect(rejected, topic="services")
+        return manager, rejected
+
+    manager, rejected = asyncio.run(run())
+    assert rejected.closed_with == 1013
+    stats = manager.get_connection_stats()
+    assert (stats["live"], stats["rejected"]) == (1, 1)
+
+
+def test_dashboard_pushes_deltas(db_tables):
+    client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+    with client.websocket_connect("/api/v1/ws/dashboard") as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "dashboard"
+        assert snapshot["statistics"] == {
+            "total_clients": 0,
+            "total_vehicles": 1,
+            "services_today": 1,
+        }
+        assert len(snapshot["recent_logs"]) == 1
+
+        # Dashboard subscribers get deltas, not the entity events
+        client.post(
+            "/api/v1/service/", json={"plate_id": "XYZ789", "kind": "tire_shine"}
+        )
+        delta = websocket.receive_json()
+        assert delta["type"] == "dashboard_delta"
+        assert delta["statistics"] == {"total_vehicles": 2, "services_today": 2}
+        assert delta["log"]["description"] == "Service created for vehicle XYZ789"
+
+        # Deleting a missing row is a 404 and no event, so no decrement
+        assert client.delete("/api/v1/vehicle/999").status_code == 404
+        assert client.delete("/api/v1/client/999").status_code == 404
+
+        client.post("/api/v1/client/", json={"name": "Ana"})
+        delta = websocket.receive_json()
+        assert delta["statistics"] == {"total_clients": 1}
+
+
+def test_dashboard_counters_reconcile(db_tables):
+    client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+    stats = client.get("/api/v1/dashboard/stats").json()["statistics"]
+    assert stats == {"total_clients": 0, "total_vehicles": 1, "services_today": 1}
+
+    # Rows written behind the API's back are picked up by the next recount
+    with SessionLocal() as db:
+        db.add(Client(name="Ana"))
+        db.commit()
+    stats = client.get("/api/v1/dashboard/stats").json()["statistics"]
+    assert stats["total_clients"] == 0
+    with SessionLocal() as db:
+        assert dashboard.reconcile(query_counts(db)) == {"total_clients": 1}
+    stats = client.get("/api/v1/dashboard/stats").json()["statistics"]
+    assert stats["total_clients"] == 1
+
+    # Events applied while a recount runs are kept: only the drift between
+    # the recount and the counters when it started is corrected
+    baseline = dashboard.statistics()
+    with SessionLocal() as db:
+        counts = query_counts(db)
+    dashboard.total_clients += 2
+    counts["statistics"]["total_clients"] += 1
+    assert dashboard.reconcile(counts, baseline) == {"total_clients": 4}
+
+
+def test_dashboard_recent_logs_are_persisted_rows(db_tables):
+    client.post("/api/v1/service/", json={"plate_id": "ABC123", "kind": "tire_shine"})
+    logs = client.get("/api/v1/dashboard/stats").json()["recent_logs"]
+    with SessionLocal() as db:
+        rows = db.query(ActivityLog).order_by(ActivityLog.id.desc()).all()
+        assert [log["id"] for log in logs] == [row.id for row in rows]
+        assert [log["description"] for log in logs] == [r.description for r in rows]
+
+        # Logged without a broadcast event: picked up by the reconcile pass
+        create_log(db, ActionType.LOGIN, EntityType.AUTH, None, "User ana logged in")
+    logs = client.get("/api/v1/dashboard/stats").json()["recent_logs"]
+    assert logs[0]["description"] != "User ana logged in"
+    asyncio.run(dashboard.refresh_logs(force=True))
+    logs = client.get("/api/v1/dashboard/stats").json()["recent_logs"]
+    assert logs[0]["description"] == "User ana logged in"